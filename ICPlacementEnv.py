@@ -7,23 +7,27 @@ import pandas as pd
 import numpy as np
 from typing import List, Optional, Tuple
 import rectangle_packing_solver as rps
-from rectangle_packing_solver import SequencePair
+from rectangle_packing_solver import lcs
 
 
 class ICPlacementEnv(gym.Env):
     """A IC Placement environment for OpenAI gym"""
     metadata = {'render.modes': ['human']}
 
-    def __init__(self, problem, state, block_idx, step_size=200, sa_count=5000):
+    def __init__(self, problem, state, block_idx, step_size=200, sa_count=5000, cancel_token=None):
         super(ICPlacementEnv, self).__init__()
 
         self.problem = problem
-        self.state = state
+        # The initial (seeded) state, restored by reset()
+        self.init_state = state[:]
+        self.state = state[:]
         self.curblock = block_idx
         self.current_step = 0
         self.total_ppo = step_size
         self.current_epoc = 0
         self.sa_count = sa_count
+        # multiprocessing.Event to stop the SA of the episodes (the env runs in a subprocess of SubprocVecEnv)
+        self.cancel_token = cancel_token
 
         '''
         action space consists of choosing a candidate block bc from all blocks in response
@@ -98,15 +102,19 @@ class ICPlacementEnv(gym.Env):
 
     def step(self, action):
         # Execute one time step within the environment
-        gp_old, gn_old, rotation_old = self.retrieve_pairs(self.problem.n, self.state)
-        seqpair_old = SequencePair(pair=(gp_old, gn_old))
-        floorplan_old = seqpair_old.decode(problem=self.problem, rotations=rotation_old)
+        state_old = self.state[:]
         # take the action
         self._take_action(action)
 
+        # decode the old and new sequence pairs (for two states, the LCS decoder is faster than a batch decode)
+        width_old, height_old = lcs.bounding_box(self.problem, state_old)
+        width_new, height_new = lcs.bounding_box(self.problem, self.state)
+        area_old = width_old * height_old
+        area_new = width_new * height_new
+
         # at the first loop of each epoc, let's calcuate the cost function first for the global reward
         if self.current_step == 0:
-            self.prevCost = float(floorplan_old.area)
+            self.prevCost = float(area_old)
 
         self.current_step += 1
 
@@ -117,19 +125,15 @@ class ICPlacementEnv(gym.Env):
         if self.current_step < self.total_ppo:
             done = False
 
-            # calculate the reward based on the new and old sequence pairs
-            seqpair_new = SequencePair(pair=(gp_new, gn_new))
-            floorplan_new = seqpair_new.decode(problem=self.problem, rotations=rotation_new)
-
             # difference of two costs functions will be the reward
-            reward = float(floorplan_new.area) - float(floorplan_old.area)
+            reward = float(area_new) - float(area_old)
         else:
             self.current_epoc += 1
             print(f'End of Epoc: {self.current_epoc}')
 
             done = True
-            solution = rps.Solver().solve(problem=self.problem, init_gp=gp_new, init_gn=gn_new, simanneal_minutes=1.0,
-                                          simanneal_steps=self.sa_count)
+            solution = rps.Solver().solve(problem=self.problem, init_gp=gp_new, init_gn=gn_new, init_rot=rotation_new, simanneal_minutes=1.0,
+                                          simanneal_steps=self.sa_count, cancel_token=self.cancel_token)
 
             reward = float(solution.floorplan.area) - self.prevCost
 
@@ -145,13 +149,7 @@ class ICPlacementEnv(gym.Env):
         # Reset the state of the environment to an initial state
         self.current_step = 0
         self.curblock = random.randint(0, self.problem.n)
-        init_gp = list(range(self.problem.n))
-        init_gn = list(range(self.problem.n))
-        random.shuffle(init_gp)
-        random.shuffle(init_gn)
-        init_rot = [0 for _ in range(self.problem.n)]
-        init_state = init_gp + init_gn + init_rot
-        self.state = init_state
+        self.state = self.init_state[:]
 
         return self._next_observation()
 
@@ -11,6 +11,8 @@ import json
 import hashlib
 import time
 import threading
+import multiprocessing
+import queue
 
 
 app = Flask(__name__)
@@ -89,10 +91,15 @@ def _create_dummy_problem() -> Dict:
 
 
 class ICPlacement:
-    def __init__(self, problems_: Dict):
+    def __init__(self, problems_: Dict, cancel_token=None):
         self.problems = problems_
         self.top = False
         self.b_createfile = True
+        # multiprocessing.Event, set to stop the RL training and SA and return the best placement so far
+        self.cancel_token = cancel_token
+
+    def cancelled(self) -> bool:
+        return (self.cancel_token is not None) and self.cancel_token.is_set()
 
     @classmethod
     def _check_fixed_blocks(cls, components: List[Dict]) -> bool:
@@ -111,12 +118,8 @@ class ICPlacement:
         return True
 
     def _get_optimized_placement(self, problem: rps.Problem, top) -> rps.Solution:
-        # Define the sequence pair, this pair will be defined outside later
-        init_gp = list(range(problem.n))
-        init_gn = list(range(problem.n))
-        random.shuffle(init_gp)
-        random.shuffle(init_gn)
-        init_rot = [0 for _ in range(problem.n)]
+        # Define the sequence pair, seeded by a constructive (skyline) placement instead of a random shuffle
+        init_gp, init_gn, init_rot = rps.Seeder.seed(problem, method="skyline")
         init_state = init_gp + init_gn + init_rot
 
         # set #epoch
@@ -149,19 +152,29 @@ class ICPlacement:
         init_block_idx = random.randint(0, problem.n)
 
         # The algorithms require a vectorized environment to run
-        env = SubprocVecEnv([lambda: ICPlacementEnv.ICPlacementEnv(problem, init_state, init_block_idx, n_steps, n_sa_count), lambda: ICPlacementEnv.ICPlacementEnv(problem, init_state, init_block_idx, n_steps, n_sa_count)
-                                , lambda: ICPlacementEnv.ICPlacementEnv(problem, init_state, init_block_idx, n_steps, n_sa_count), lambda: ICPlacementEnv.ICPlacementEnv(problem, init_state, init_block_idx, n_steps, n_sa_count)])
+        cancel_token = self.cancel_token
+        env = SubprocVecEnv([lambda: ICPlacementEnv.ICPlacementEnv(problem, init_state, init_block_idx, n_steps, n_sa_count, cancel_token) for _ in range(4)])
         model = PPO2(MlpPolicy, env, n_steps=n_steps)
 
         print("problem:", problem)
 
-        model.learn(total_timesteps=n_epoch * n_steps)
+        # The training stops at the next agent step once cancelled (the callback returns False)
+        model.learn(total_timesteps=n_epoch * n_steps, callback=lambda locals_, globals_: not self.cancelled())
+
+        if self.cancelled():
+            # The best placement so far is the skyline seed
+            env.close()
+            return rps.Solver().solve(problem=problem, init_gp=init_gp, init_gn=init_gn, init_rot=init_rot, cancel_token=cancel_token)
+
         obs = env.reset()
 
         # result when trained by using RL and SA
         action, _states = model.predict(obs)
         obs, rewards, done, info = env.step(action)
-        solution = rps.Solver().solve(problem=problem, init_gp=obs[0][0].tolist(), init_gn=obs[0][1].tolist(), simanneal_minutes=1.0, simanneal_steps=n_sa_count)
+        env.close()
+        # The RL agent swaps the blocks in G_{+} and G_{-}, the rotations stay as seeded
+        solution = rps.Solver().solve(problem=problem, init_gp=obs[0][0].tolist(), init_gn=obs[0][1].tolist(), init_rot=init_rot,
+                                      simanneal_minutes=1.0, simanneal_steps=n_sa_count, cancel_token=cancel_token)
 
         '''
         if self.b_createfile is True:
@@ -176,52 +189,76 @@ class ICPlacement:
         return solution
 
     def get_result(self) -> Dict:
+        """
+        Solve every layer (a key whose value has the components, e.g. TopLayer and BottomLayer).
+        The layers are independent, so they are solved in parallel, each in its own process.
+        """
+        layers = []
+        workers = []
         try:
-            blocks_t = self.problems["TopLayer"]
-            blocks_b = self.problems["BottomLayer"]
+            layers = [key for key, value in self.problems.items()
+                      if isinstance(value, dict) and value.get(CONST_STR_COMPONENTS) is not None]
 
-            if (blocks_t is not None) and (blocks_t.get(CONST_STR_PREDEFINED_BLOCKS) is not None):
-                if self._check_fixed_blocks(blocks_t[CONST_STR_PREDEFINED_BLOCKS]) is False:
+            for layer in layers:
+                fixed_blocks = self.problems[layer].get(CONST_STR_PREDEFINED_BLOCKS)
+                if (fixed_blocks is not None) and self._check_fixed_blocks(fixed_blocks) is False:
                     print("Pre defined blocks are overlapped")
                     exit(0)
 
-            if (blocks_b is not None) and (blocks_b.get(CONST_STR_PREDEFINED_BLOCKS) is not None):
-                if self._check_fixed_blocks(blocks_b[CONST_STR_PREDEFINED_BLOCKS]) is False:
-                    print("Pre defined blocks are overlapped")
-                    exit(0)
+            if len(layers) <= 1:
+                return {layer: self._get_layer_result(layer) for layer in layers}
 
-            solution_t = None
-            if (blocks_t is not None) and blocks_t.get(CONST_STR_COMPONENTS) is not None:
-                # Define the problems first, assumes that 20 components with different widths and heights are generated for testing
-                problem_t = rps.Problem(rectangles=blocks_t[CONST_STR_COMPONENTS], fixed_blocks=blocks_t[CONST_STR_PREDEFINED_BLOCKS])
-                solution_t = self._get_optimized_placement(problem_t, False)
-
-            solution_b = None
-            if (blocks_t is not None) and blocks_b.get(CONST_STR_COMPONENTS) is not None:
-                # Define the problems first, assumes that 20 components with different widths and heights are generated for testing
-                problem_b = rps.Problem(rectangles=blocks_b[CONST_STR_COMPONENTS], fixed_blocks=blocks_b[CONST_STR_PREDEFINED_BLOCKS])
-                solution_b = self._get_optimized_placement(problem_b, True)
-
-            return {
-                CONST_STR_TOP_LAYER:
-                    {
-                        "positions": str(solution_t.floorplan.positions),
-                        "bounding_box": str(solution_t.floorplan.bounding_box),
-                        "area": str(solution_t.floorplan.area)
-                    },
-                CONST_STR_BOTTOM_LAYER:
-                    {
-                        "positions": str(solution_b.floorplan.positions),
-                        "bounding_box": str(solution_b.floorplan.bounding_box),
-                        "area": str(solution_b.floorplan.area)
-                    },
-            }
+            # Not a (daemonic) process pool: the workers create the SubprocVecEnv processes of the RL training
+            results = multiprocessing.Queue()
+            workers = [multiprocessing.Process(target=_solve_layer, args=(self.problems, layer, self.cancel_token, results))
+                       for layer in layers]
+            for worker in workers:
+                worker.start()
+
+            # Read the results before joining, so that a worker is not blocked on a full queue
+            result = {}
+            while len(result) < len(layers):
+                try:
+                    layer, layer_result = results.get(timeout=1.0)
+                    result[layer] = layer_result
+                except queue.Empty:
+                    if not any(worker.is_alive() for worker in workers) and results.empty():
+                        break
+            for worker in workers:
+                worker.join()
+
+            # A layer whose worker died has no result
+            return {layer: result.get(layer) for layer in layers}
         except Exception as e:
             print(f"{e}")
-            return {
-                CONST_STR_TOP_LAYER: None,
-                CONST_STR_BOTTOM_LAYER: None,
-            }
+            # Do not leave the workers running (or as zombies)
+            for worker in workers:
+                if worker.pid is None:
+                    continue  # not started
+                if worker.is_alive():
+                    worker.terminate()
+                worker.join()
+            return {layer: None for layer in layers}
+
+    def _get_layer_result(self, layer: str) -> Dict:
+        blocks = self.problems[layer]
+        problem = rps.Problem(rectangles=blocks[CONST_STR_COMPONENTS], fixed_blocks=blocks.get(CONST_STR_PREDEFINED_BLOCKS))
+        solution = self._get_optimized_placement(problem, layer != CONST_STR_TOP_LAYER)
+
+        return {
+            "positions": str(solution.floorplan.positions),
+            "bounding_box": str(solution.floorplan.bounding_box),
+            "area": str(solution.floorplan.area)
+        }
+
+
+def _solve_layer(problems: Dict, layer: str, cancel_token, results) -> None:
+    # Worker process of ICPlacement.get_result: solve a layer and put (layer, result), or (layer, None) on failure
+    try:
+        results.put((layer, ICPlacement(problems, cancel_token)._get_layer_result(layer)))
+    except Exception as e:
+        print(f"{layer}: {e}")
+        results.put((layer, None))
 
 
 # ## Run it
@@ -251,9 +288,9 @@ def solving_problems():
                     if value['status'] is not 0:
                         continue
                     value['status'] = 1
-                    placement = ICPlacement(value['problems'])
+                    placement = ICPlacement(value['problems'], value['cancel_token'])
                     value['result'] = placement.get_result()
-                    value['status'] = 2
+                    value['status'] = 4 if placement.cancelled() else 2
                 except Exception as e:
                     value['status'] = 3
                     value['error'] = str(e)
@@ -277,6 +314,11 @@ def ic_placement():
             prob_id = content['problems_id']
             if prob_id in placement_dict:
                 task = placement_dict[prob_id]
+                if content.get('cancel'):
+                    # A running task stops and keeps its best placement so far, a waiting one is not started
+                    task['cancel_token'].set()
+                    if task['status'] == 0:
+                        task['status'] = 4
                 if task['status'] is 0:
                     result = {'problems_id': prob_id, 'status': "Not started yet", 'result': None}
                 elif task['status'] is 1:
@@ -285,6 +327,8 @@ def ic_placement():
                     result = {'problems_id': prob_id, 'status': "Success", 'result': task['result']}
                 elif task['status'] is 3:
                     result = {'problems_id': prob_id, 'status': "Failed", 'result': task['error']}
+                elif task['status'] == 4:
+                    result = {'problems_id': prob_id, 'status': "Cancelled", 'result': task['result']}
                 else:
                     result = {'problems_id': prob_id, 'status': "Failed", 'result': 'Unknown'}
                 return jsonify(result)
@@ -302,7 +346,8 @@ def ic_placement():
         result = {'problems_id': str_hash, 'status': 'Already existed problems'}
         if str_hash in placement_dict:
             return jsonify(result)
-        new_task = {'problems': problems, 'status': 0, 'result': None, 'error': ''}  # 0: not started yet, 1: running, 2: success, 3: failed
+        new_task = {'problems': problems, 'status': 0, 'result': None, 'error': '',
+                    'cancel_token': multiprocessing.Event()}  # 0: not started yet, 1: running, 2: success, 3: failed, 4: cancelled
         placement_dict[str_hash] = new_task
         result['status'] = 'Pushed new task'
         return jsonify(result)
@@ -17,11 +17,15 @@ from .__version__ import __version__, __version_info__
 # Classes
 from .floorplan import Floorplan
 from .problem import Problem
+from .schedule_cache import ScheduleCache
+from .seeder import Seeder
 from .sequence_pair import SequencePair
+from .snapshot import Snapshot
 from .solution import Solution
 
 # Solvers
 from .solver import Solver
+from .vectorized import VectorizedSolver, decode_batch
 
 # Visualizers
 from .visualizer import Visualizer
@@ -31,8 +35,13 @@ __all__ = [
     "__version_info__",
     "Floorplan",
     "Problem",
+    "ScheduleCache",
+    "Seeder",
     "SequencePair",
+    "Snapshot",
     "Solution",
     "Solver",
+    "VectorizedSolver",
+    "decode_batch",
     "Visualizer",
 ]
@@ -0,0 +1,111 @@
+# Copyright 2021 Kotaro Terada
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Dict, List, Optional, Tuple
+
+
+class _Node:
+    """
+    A node of the centered interval tree.
+    """
+
+    __slots__ = ("center", "by_bottom", "by_top", "lower", "upper")
+
+    def __init__(self, blocks: List[Tuple]) -> None:
+        endpoints = sorted([b[2] for b in blocks] + [b[3] for b in blocks])
+        self.center = endpoints[len(endpoints) // 2]
+
+        here = [b for b in blocks if b[2] <= self.center <= b[3]]
+        lower = [b for b in blocks if b[3] < self.center]
+        upper = [b for b in blocks if b[2] > self.center]
+
+        # Blocks over the center, sorted by bottom (ascending) and by top (descending)
+        self.by_bottom = sorted(here, key=lambda b: b[2])
+        self.by_top = sorted(here, key=lambda b: b[3], reverse=True)
+        self.lower: Optional[_Node] = _Node(lower) if lower else None
+        self.upper: Optional[_Node] = _Node(upper) if upper else None
+
+
+class FixedBlockIndex:
+    """
+    A spatial index of the pre-defined (fixed) blocks.
+
+    The vertical intervals of the fixed blocks are stored in a centered interval tree,
+    so the fixed blocks overlapping a horizontal band are found in O(log m + k).
+    """
+
+    def __init__(self, fixed_blocks: List[Dict]) -> None:
+        # (left, right, bottom, top), sorted by the left edge
+        self.blocks = sorted((b["left"], b["right"], b["bottom"], b["top"]) for b in fixed_blocks)
+        self.root: Optional[_Node] = _Node(self.blocks) if self.blocks else None
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    def query(self, bottom: float, top: float) -> List[Tuple]:
+        """
+        Find the fixed blocks whose vertical intervals overlap (bottom, top).
+        """
+
+        found: List[Tuple] = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            if top <= node.center:
+                for b in node.by_bottom:
+                    if b[2] >= top:
+                        break
+                    found.append(b)
+                if node.lower is not None:
+                    stack.append(node.lower)
+            elif bottom >= node.center:
+                for b in node.by_top:
+                    if b[3] <= bottom:
+                        break
+                    found.append(b)
+                if node.upper is not None:
+                    stack.append(node.upper)
+            else:
+                found.extend(node.by_bottom)
+                if node.lower is not None:
+                    stack.append(node.lower)
+                if node.upper is not None:
+                    stack.append(node.upper)
+
+        return found
+
+    def legalize(self, left: float, width: float, bottom: float, top: float) -> float:
+        """
+        Move a block (left, left + width) x (bottom, top) to the right until it does not overlap any fixed block,
+        and return its new left edge.
+
+        The candidates are visited by their left edges. Since the block only moves to the right,
+        a fixed block already passed never overlaps it again, and the visit stops at the first fixed block
+        on the right of the block, so the result is always overlap-free.
+        """
+
+        candidates = self.query(bottom, top)
+        if not candidates:
+            return left
+
+        candidates.sort()
+        right = left + width
+        for b in candidates:
+            if b[0] >= right:
+                break
+            if left < b[1]:
+                left = b[1]
+                right = left + width
+
+        return left
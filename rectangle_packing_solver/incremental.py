@@ -0,0 +1,351 @@
+# Copyright 2021 Kotaro Terada
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import List, Optional, Set, Tuple
+
+from .problem import Problem
+from .wirelength import Wirelength
+
+
+class IncrementalEvaluator:
+    """
+    An incremental evaluator of a sequence pair for annealing moves.
+
+    It keeps the longest-path arrays of the last accepted state: the right edges in the order of G_{+}
+    and the top edges in the order of G_{-}. After a swap (and an optional rotation), only the blocks
+    whose constraint relations changed and the blocks pushed by a moved block are recomputed, and a
+    rejected move is rolled back from the overwritten edges without decoding again.
+
+    The savings are modest: every move rebuilds the prefix trees up to the first affected block (O(n)), and
+    once a block moves, the scan runs to the end of the sequence. A swap and its rollback cost about 0.6-0.75x
+    of a full decode (n = 300 to 2000), and the annealing makes about 1.3-1.4x more moves per second at n = 300.
+
+    If the problem has nets, their wirelength is kept too, and only the nets connected to the moved blocks
+    are recomputed after a move.
+    """
+
+    def __init__(self, problem: Problem, state: List[int]) -> None:
+        if not isinstance(problem, Problem):
+            raise TypeError("Invalid argument: 'problem' must be an instance of Problem.")
+
+        self.problem = problem
+        self.n = problem.n
+        self.wirelength: Optional[Wirelength] = Wirelength(problem) if problem.nets else None
+        self.load(state)
+
+    def load(self, state: List[int]) -> None:
+        """
+        Evaluate a state (= G_{+} + G_{-} + rotations) from scratch.
+        """
+
+        n = self.n
+        if len(state) != 3 * n:
+            raise ValueError("'state' length must be three times 'problem.n'.")
+
+        self.gp = state[0:n]
+        self.gn = state[n : 2 * n]
+        self.rotations = state[2 * n : 3 * n]
+
+        self.pos_p = [0] * n
+        self.pos_n = [0] * n
+        for k in range(n):
+            self.pos_p[self.gp[k]] = k
+            self.pos_n[self.gn[k]] = k
+
+        # Width and height dealing with rotations
+        self.widths, self.heights = self.problem.dimensions(self.rotations)
+
+        self.right = [0] * n  # right edges, indexed by the position in G_{+}
+        self.top = [0] * n  # top edges, indexed by the position in G_{-}
+        self._undo: Optional[Tuple] = None
+        self._update()
+
+        if self.wirelength is not None:
+            self.wirelength.load([self.center(i) for i in range(n)], self.rotations)
+
+    def matches(self, state: List[int]) -> bool:
+        """
+        Whether the (committed or pending) evaluated state is the same as the given one.
+        """
+
+        n = self.n
+        return state[0:n] == self.gp and state[n : 2 * n] == self.gn and state[2 * n : 3 * n] == self.rotations
+
+    @property
+    def bounding_box(self) -> Tuple:
+        return (max(self.right, default=0), max(self.top, default=0))
+
+    @property
+    def hpwl(self) -> float:
+        """
+        Total wirelength of the nets (zero without nets).
+        """
+
+        return self.wirelength.total if self.wirelength is not None else 0.0
+
+    def center(self, i: int) -> Tuple:
+        """
+        Center (x, y) of the block i.
+        """
+
+        return (
+            self.right[self.pos_p[i]] - self.widths[i] / 2,
+            self.top[self.pos_n[i]] - self.heights[i] / 2,
+        )
+
+    def positions(self) -> List[Tuple]:
+        """
+        Bottom-left positions (x, y) of all blocks.
+        """
+
+        return [
+            (self.right[self.pos_p[i]] - self.widths[i], self.top[self.pos_n[i]] - self.heights[i]) for i in range(self.n)
+        ]
+
+    def swap(self, i: int, j: int, sequence: int = 0, rotate: Optional[int] = None) -> Tuple:
+        """
+        Swap the i-th and j-th entries of G_{+} (sequence=0) or G_{-} (sequence=1), optionally rotate
+        a block, and return the new bounding box. The previous pending move is committed.
+        """
+
+        self.commit()
+
+        if i > j:
+            i, j = j, i
+        pos_p, pos_n = self.pos_p, self.pos_n
+        if sequence == 0:
+            seq, pos, edges = self.gp, pos_p, self.right
+        else:
+            seq, pos, edges = self.gn, pos_n, self.top
+
+        u, v = seq[i], seq[j]
+        seq[i], seq[j] = v, u
+        pos[u], pos[v] = j, i
+        # The edges of the swapped blocks follow them to their new positions
+        edges[i], edges[j] = edges[j], edges[i]
+
+        # Only the blocks between u and v in the swapped sequence change their relations to u and v. Swapping G_{+},
+        # a block gains or loses u or v as a left or lower constraint only if one of them comes earlier in G_{-};
+        # swapping G_{-}, as a left one if one of them comes earlier in G_{+}, and as a lower one if later.
+        between = seq[i + 1 : j]
+        if sequence == 0:
+            first = min(pos_n[u], pos_n[v])
+            forced_x = set(b for b in between if pos_n[b] > first)
+            forced_y = set(forced_x)
+        else:
+            first, last = min(pos_p[u], pos_p[v]), max(pos_p[u], pos_p[v])
+            forced_x = set(b for b in between if pos_p[b] > first)
+            forced_y = set(b for b in between if pos_p[b] < last)
+        forced_x.update((u, v))
+        forced_y.update((u, v))
+
+        old_rotation = None
+        if rotate is not None:
+            old_rotation = self.rotations[rotate]
+            self.rotations[rotate] = old_rotation + 1
+            self.widths[rotate], self.heights[rotate] = self.heights[rotate], self.widths[rotate]
+            forced_x.add(rotate)
+            forced_y.add(rotate)
+
+        old_right, old_top = self._update(forced_x, forced_y)
+        self._undo = (sequence, i, j, rotate, old_rotation, old_right, old_top)
+
+        if self.wirelength is not None:
+            # The moved blocks: a changed right or top edge, or the rotated block (whose pins turn)
+            moved = set(self.gp[k] for k, _ in old_right)
+            moved.update(self.gn[k] for k, _ in old_top)
+            if rotate is not None:
+                moved.add(rotate)
+            self.wirelength.move({b: self.center(b) for b in moved}, self.rotations)
+
+        return self.bounding_box
+
+    def commit(self) -> None:
+        """
+        Accept the pending move.
+        """
+
+        self._undo = None
+        if self.wirelength is not None:
+            self.wirelength.commit()
+
+    def rollback(self) -> None:
+        """
+        Reject the pending move and restore the last accepted state.
+        """
+
+        if self._undo is None:
+            return
+
+        if self.wirelength is not None:
+            self.wirelength.rollback()
+
+        sequence, i, j, rotate, old_rotation, old_right, old_top = self._undo
+        self._undo = None
+
+        right, top = self.right, self.top
+        for k, x in old_right:
+            right[k] = x
+        for k, y in old_top:
+            top[k] = y
+
+        if sequence == 0:
+            seq, pos, edges = self.gp, self.pos_p, right
+        else:
+            seq, pos, edges = self.gn, self.pos_n, top
+        u, v = seq[i], seq[j]
+        seq[i], seq[j] = v, u
+        pos[u], pos[v] = j, i
+        edges[i], edges[j] = edges[j], edges[i]
+
+        if rotate is not None:
+            self.rotations[rotate] = old_rotation
+            self.widths[rotate], self.heights[rotate] = self.heights[rotate], self.widths[rotate]
+
+    def _update(self, forced_x: Optional[Set[int]] = None, forced_y: Optional[Set[int]] = None) -> Tuple[List, List]:
+        """
+        Recompute the right edges of the blocks in forced_x and the top edges of the blocks in forced_y
+        (all the blocks if None), and the edges of the blocks pushed by a moved block.
+
+        The scans start from the first forced block and stop once no later block can move.
+        Returns the overwritten edges as lists of (position, old edge).
+        """
+
+        n = self.n
+        gp, gn = self.gp, self.gn
+        pos_p, pos_n = self.pos_p, self.pos_n
+        widths, heights = self.widths, self.heights
+        right, top = self.right, self.top
+        fixed_index = self.problem.fixed_block_index or None  # (checked once, not for every block)
+        old_right: List[Tuple] = []
+        old_top: List[Tuple] = []
+
+        # Vertical: visit G_{-} and query the blocks placed later in G_{+} (reversed index)
+        if forced_y is None:
+            forced_y = set(range(n))
+        if forced_y:
+            sy = min(pos_n[b] for b in forced_y)
+            last = max(pos_n[b] for b in forced_y)
+
+            tree = self._tree(n, [n - pos_p[b] for b in gn[:sy]], top[:sy])
+
+            # The last position in G_{+} of the moved blocks, which can push up the blocks before it
+            moved = -1
+            for k in range(sy, n):
+                if k > last and moved < 0:
+                    break
+
+                b = gn[k]
+                p = pos_p[b]
+                y = top[k]
+                if (p < moved) or (b in forced_y):
+                    below = 0
+                    t = n - 1 - p
+                    while t > 0:
+                        if below < tree[t]:
+                            below = tree[t]
+                        t -= t & -t
+                    y = below + heights[b]
+                    if y != top[k]:
+                        old_top.append((k, top[k]))
+                        top[k] = y
+                        if moved < p:
+                            moved = p
+
+                # The nodes on the update path cover growing ranges, so the rest is already high enough
+                t = n - p
+                while t <= n and tree[t] < y:
+                    tree[t] = y
+                    t += t & -t
+
+        # The fixed blocks shift the blocks horizontally depending on their vertical positions
+        if forced_x is None:
+            forced_x = set(range(n))
+        if fixed_index:
+            forced_x.update(gn[k] for k, _ in old_top)
+
+        # Horizontal: visit G_{+} and query the blocks placed earlier in G_{-}
+        if forced_x:
+            sx = min(pos_p[b] for b in forced_x)
+            last = max(pos_p[b] for b in forced_x)
+
+            tree = self._tree(n, [pos_n[b] + 1 for b in gp[:sx]], right[:sx])
+
+            # The first position in G_{-} of the moved blocks, which can push right the blocks after it
+            moved = n
+            for k in range(sx, n):
+                if k > last and moved == n:
+                    break
+
+                b = gp[k]
+                q = pos_n[b]
+                x = right[k]
+                if (moved < q) or (b in forced_x):
+                    left = 0
+                    t = q
+                    while t > 0:
+                        if left < tree[t]:
+                            left = tree[t]
+                        t -= t & -t
+
+                    # Consider the pre defined(fixed) blocks
+                    if fixed_index:
+                        y = top[q]
+                        left = fixed_index.legalize(left, widths[b], y - heights[b], y)
+
+                    x = left + widths[b]
+                    if x != right[k]:
+                        old_right.append((k, right[k]))
+                        right[k] = x
+                        if q < moved:
+                            moved = q
+
+                t = q + 1
+                while t <= n and tree[t] < x:
+                    tree[t] = x
+                    t += t & -t
+
+        return (old_right, old_top)
+
+    @classmethod
+    def _tree(cls, n: int, indices: List[int], values: List) -> List:
+        """
+        Fenwick tree for prefix maximum over the indices 1..n with the given leaves. A few leaves are inserted
+        one by one, and more are built in O(n).
+        """
+
+        tree = [0] * (n + 1)
+        if len(indices) * n.bit_length() < n:
+            for t, x in zip(indices, values):
+                while t <= n and tree[t] < x:
+                    tree[t] = x
+                    t += t & -t
+        else:
+            for t, x in zip(indices, values):
+                tree[t] = x
+            cls._build(tree)
+
+        return tree
+
+    @classmethod
+    def _build(cls, tree: List) -> None:
+        """
+        Build a Fenwick tree for prefix maximum in O(n) from its leaves.
+        """
+
+        n = len(tree) - 1
+        for k in range(1, n + 1):
+            parent = k + (k & -k)
+            if parent <= n and tree[parent] < tree[k]:
+                tree[parent] = tree[k]
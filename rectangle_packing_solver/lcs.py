@@ -0,0 +1,138 @@
+# Copyright 2021 Kotaro Terada
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import List, Optional, Sequence, Tuple
+
+from .fixed_block_index import FixedBlockIndex
+from .problem import Problem
+
+
+def longest_paths(
+    gp: Sequence[int],
+    gn: Sequence[int],
+    widths: Sequence,
+    heights: Sequence,
+    fixed_index: Optional[FixedBlockIndex],
+    pos_p: Optional[Sequence[int]] = None,
+    pos_n: Optional[Sequence[int]] = None,
+    width_limit: Optional[float] = None,
+    height_limit: Optional[float] = None,
+) -> Tuple[List, List]:
+    """
+    Calculate the longest paths of the horizontal and vertical constraint graphs
+    by the weighted longest common subsequence formulation (FAST-SP).
+
+    Instead of building the constraint graphs explicitly, the blocks are visited in the order of
+    a sequence and a Fenwick tree (indexed by the position in the other sequence) keeps the
+    prefix maximum of the already placed blocks. The time complexity is O(n log n).
+
+    The positions of each block in G_{+} and G_{-} (pos_p and pos_n) are calculated if not given.
+    Returns a tuple of the right edges (dist_h) and the top edges (dist_v) of all blocks,
+    which are the same as the ones of the graph based decoder.
+
+    If width_limit (height_limit) is given, the decode stops as soon as a right (top) edge exceeds it,
+    and the edges not calculated yet are left as zero: the result then only tells that the limit is exceeded.
+    """
+
+    n = len(gp)
+    if (pos_p is None) or (pos_n is None):
+        pos_p = [0] * n
+        pos_n = [0] * n
+        for k in range(n):
+            pos_p[gp[k]] = k
+            pos_n[gn[k]] = k
+
+    # Vertical: when j is below i, j comes after i in G_{+} and before i in G_{-}.
+    # Visit G_{-} in order and query the blocks placed later in G_{+} (reversed index).
+    dist_h = [0] * n
+    dist_v = [0] * n
+    tree = [0] * (n + 1)
+    for b in gn:
+        r = n - 1 - pos_p[b]
+        below = 0
+        k = r
+        while k > 0:
+            if below < tree[k]:
+                below = tree[k]
+            k -= k & -k
+        top = below + heights[b]
+        dist_v[b] = top
+        if (height_limit is not None) and (top > height_limit):
+            return (dist_h, dist_v)
+        k = r + 1
+        while k <= n:
+            if tree[k] < top:
+                tree[k] = top
+            k += k & -k
+
+    # Horizontal: when j is left of i, j comes before i in both G_{+} and G_{-}.
+    # Visit G_{+} in order and query the blocks placed earlier in G_{-}.
+    tree = [0] * (n + 1)
+    for b in gp:
+        q = pos_n[b]
+        left = 0
+        k = q
+        while k > 0:
+            if left < tree[k]:
+                left = tree[k]
+            k -= k & -k
+
+        # Consider the pre defined(fixed) blocks, the block is moved to the right if it is overlapped
+        if fixed_index:
+            top = dist_v[b]
+            left = fixed_index.legalize(left, widths[b], top - heights[b], top)
+
+        right = left + widths[b]
+        dist_h[b] = right
+        if (width_limit is not None) and (right > width_limit):
+            break
+        k = q + 1
+        while k <= n:
+            if tree[k] < right:
+                tree[k] = right
+            k += k & -k
+
+    return (dist_h, dist_v)
+
+
+def bounding_box(
+    problem: Problem, state: List[int], width_limit: Optional[float] = None, height_limit: Optional[float] = None
+) -> Tuple:
+    """
+    Calculate only the bounding box of a state (= G_{+} + G_{-} + rotations) of the problem.
+
+    This is an allocation-light path for the energy of the annealing:
+    no SequencePair, positions, or Floorplan are built.
+    With width_limit or height_limit, an infeasible state is detected early (see longest_paths),
+    and the returned bounding box is then only guaranteed to exceed the limit.
+    """
+
+    n = problem.n
+    if n == 0:
+        return (0, 0)
+
+    # Width and height dealing with rotations
+    widths, heights = problem.dimensions(state[2 * n : 3 * n])
+
+    dist_h, dist_v = longest_paths(
+        gp=state[0:n],
+        gn=state[n : 2 * n],
+        widths=widths,
+        heights=heights,
+        fixed_index=problem.fixed_block_index,
+        width_limit=width_limit,
+        height_limit=height_limit,
+    )
+
+    return (max(dist_h), max(dist_v))
@@ -12,16 +12,30 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Dict, List, Tuple, Union
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from .fixed_block_index import FixedBlockIndex
 
 
 class Problem:
     """
     A class to represent a rectangle packing problem.
+
+    The rectangles are stored as contiguous arrays (widths, heights, and rotatable flags),
+    and both orientations are available by the rotation: widths_wrot[rotation % 2][i].
+
+    A net is a list of pins, and a pin is a rectangle id (the center of the rectangle), or a rectangle id with
+    an offset from the center as (id, x, y) or {"id": id, "x": x, "y": y}. The offset is turned by 90 degrees,
+    (x, y) -> (-y, x), when the rectangle is rotated.
     """
 
-    def __init__(self, rectangles: List[Union[Dict, List, Tuple]], fixed_blocks: List[Union[Dict, List, Tuple]] = None) -> None:
-        self.rectangles = []
+    def __init__(
+        self,
+        rectangles: List[Union[Dict, List, Tuple]],
+        fixed_blocks: List[Union[Dict, List, Tuple]] = None,
+        nets: Optional[List[List[Union[int, Dict, List, Tuple]]]] = None,
+    ) -> None:
         self.fixed_blocks = []
         self.n = 0
         self.nblocks = 0
@@ -56,30 +70,116 @@ class Problem:
 
                 self.nblocks += 1
 
+        # Spatial index of the fixed blocks, built once per problem
+        self.fixed_block_index = FixedBlockIndex(self.fixed_blocks)
+
+        widths = []
+        heights = []
+        rotatable = []
         for r in rectangles:
             if isinstance(r, (list, tuple)):
-                self.rectangles.append(
-                    {
-                        "id": self.n,
-                        "width": r[0],
-                        "height": r[1],
-                        "rotatable": r[2] if len(r) >= 3 else False,
-                    }
-                )
+                widths.append(r[0])
+                heights.append(r[1])
+                rotatable.append(bool(r[2]) if len(r) >= 3 else False)
             elif isinstance(r, dict):
-                self.rectangles.append(
-                    {
-                        "id": self.n,
-                        "width": r["width"],
-                        "height": r["height"],
-                        "rotatable": r["rotatable"] if "rotatable" in r else False,
-                    }
-                )
+                widths.append(r["width"])
+                heights.append(r["height"])
+                rotatable.append(bool(r["rotatable"]) if "rotatable" in r else False)
             else:
                 raise TypeError("A rectangle must be a list, tuple, or dict.")
 
             self.n += 1
 
+        # Integers are kept as integers, otherwise all the sizes are stored as floats
+        typecode = "q" if all(isinstance(v, int) for v in widths + heights) else "d"
+        self.widths = array(typecode, widths)
+        self.heights = array(typecode, heights)
+        self.rotatable = array("b", rotatable)
+
+        # Widths and heights with (odd rotation) and without (even rotation) rotation
+        self.widths_wrot = (self.widths, self.heights)
+        self.heights_wrot = (self.heights, self.widths)
+
+        # Nets as lists of pins (id, x offset, y offset), and the nets connected to each rectangle
+        self.nets: List[List[Tuple]] = []
+        self.nets_of: List[List[int]] = [[] for _ in range(self.n)]
+        if nets is not None:
+            if not isinstance(nets, list):
+                raise TypeError("Invalid argument: 'nets' must be a list.")
+            for net in nets:
+                self._add_net(net)
+
+    @property
+    def rectangles(self) -> List[Dict]:
+        """
+        The rectangles as a list of dict (id, width, height, and rotatable), built on demand.
+        """
+
+        return [
+            {
+                "id": i,
+                "width": self.widths[i],
+                "height": self.heights[i],
+                "rotatable": bool(self.rotatable[i]),
+            }
+            for i in range(self.n)
+        ]
+
+    @property
+    def area_lower_bound(self) -> Union[int, float]:
+        """
+        A lower bound of the bounding-box area of any solution: the sum of the areas of the rectangles,
+        or the product of the least possible width and height (the largest side of a rectangle
+        which cannot be reduced by a rotation), whichever is larger.
+        """
+
+        if self.n == 0:
+            return 0
+
+        area = sum(w * h for w, h in zip(self.widths, self.heights))
+        min_width = max(min(w, h) if rot else w for w, h, rot in zip(self.widths, self.heights, self.rotatable))
+        min_height = max(min(w, h) if rot else h for w, h, rot in zip(self.widths, self.heights, self.rotatable))
+
+        return max(area, min_width * min_height)
+
+    def _add_net(self, net: List[Union[int, Dict, List, Tuple]]) -> None:
+        if not isinstance(net, (list, tuple)):
+            raise TypeError("A net must be a list or tuple of pins.")
+
+        pins = []
+        for pin in net:
+            if isinstance(pin, int):
+                pins.append((pin, 0, 0))
+            elif isinstance(pin, (list, tuple)):
+                pins.append((pin[0], pin[1], pin[2]) if len(pin) >= 3 else (pin[0], 0, 0))
+            elif isinstance(pin, dict):
+                pins.append((pin["id"], pin.get("x", 0), pin.get("y", 0)))
+            else:
+                raise TypeError("A pin must be an int, list, tuple, or dict.")
+
+            if not (isinstance(pins[-1][0], int) and (0 <= pins[-1][0] < self.n)):
+                raise ValueError("Invalid argument: a pin must be connected to a rectangle id of the problem.")
+
+        k = len(self.nets)
+        self.nets.append(pins)
+        for i in sorted(set(pin[0] for pin in pins)):
+            self.nets_of[i].append(k)
+
+    def dimensions(self, rotations: Optional[Sequence[int]] = None) -> Tuple[Sequence, Sequence]:
+        """
+        Widths and heights of the rectangles dealing with rotations.
+        """
+
+        if rotations is None:
+            return (self.widths, self.heights)
+
+        widths_wrot = self.widths_wrot
+        heights_wrot = self.heights_wrot
+        widths = [widths_wrot[rotation % 2][i] for i, rotation in enumerate(rotations)]
+        heights = [heights_wrot[rotation % 2][i] for i, rotation in enumerate(rotations)]
+
+        return (widths, heights)
+
     def __repr__(self) -> str:
         s = "Problem({"
         s += "'n': " + str(self.n) + ", "
@@ -0,0 +1,196 @@
+# Copyright 2021 Kotaro Terada
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import math
+import os
+import tempfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None  # type: ignore
+
+from .problem import Problem
+
+
+def _round_figures(x: float, n: int) -> float:
+    """
+    Round x to n significant figures.
+    """
+
+    x = float(x)
+    if x == 0.0:
+        return 0.0
+    return round(x, int(n - math.ceil(math.log10(abs(x)))))
+
+
+def _statistics(values: Sequence, n: int) -> Dict:
+    """
+    Summary statistics of the values, rounded to n significant figures.
+    """
+
+    if len(values) == 0:
+        return {}
+
+    mean = sum(values) / len(values)
+    std = math.sqrt(sum((v - mean) ** 2 for v in values) / len(values))
+
+    return {
+        "min": _round_figures(min(values), n),
+        "max": _round_figures(max(values), n),
+        "mean": _round_figures(mean, n),
+        "std": _round_figures(std, n),
+    }
+
+
+class ScheduleCache:
+    """
+    A persistent cache of annealing schedules, keyed by a fingerprint of the problem.
+
+    The schedules are stored as a JSON file on the local disk, in the order of their last use (a get() hit
+    or a put()), and the least recently used ones are evicted when the cache has more than 'max_entries' schedules.
+
+    The cache can be shared by processes: the file is always replaced atomically, and get() and put() hold
+    an exclusive lock (a '.lock' file next to the cache, where fcntl is available) while they read, update,
+    and write the file.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 256, significant_figures: int = 2) -> None:
+        if path is None:
+            path = os.path.join(os.path.expanduser("~"), ".cache", "rectangle_packing_solver", "schedules.json")
+        if max_entries < 1:
+            raise ValueError("Invalid argument: 'max_entries' must be a positive integer.")
+
+        self.path = path
+        self.max_entries = max_entries
+        self.significant_figures = significant_figures
+        self.hits = 0
+        self.misses = 0
+
+    def fingerprint(
+        self,
+        problem: Problem,
+        width_limit: Optional[float] = None,
+        height_limit: Optional[float] = None,
+        **params: Any,
+    ) -> str:
+        """
+        Fingerprint of a problem: the number of rectangles, the statistics of their sizes (rounded to
+        significant figures, so similar problems share it), the fixed-block layout, the width/height limits,
+        and any other parameters affecting the schedule.
+        """
+
+        if not isinstance(problem, Problem):
+            raise TypeError("Invalid argument: 'problem' must be an instance of Problem.")
+
+        areas = [w * h for w, h in zip(problem.widths, problem.heights)]
+        key = {
+            "n": problem.n,
+            "widths": _statistics(problem.widths, self.significant_figures),
+            "heights": _statistics(problem.heights, self.significant_figures),
+            "areas": _statistics(areas, self.significant_figures),
+            "rotatable": sum(problem.rotatable),
+            "fixed_blocks": sorted(problem.fixed_block_index.blocks),
+            "width_limit": width_limit,
+            "height_limit": height_limit,
+            "params": params,
+        }
+
+        return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Get the schedule of the key, or None if it is not cached. A hit makes the key the most recently used one.
+        """
+
+        with self._lock():
+            entries = self._load()
+            schedule = entries.get(key)
+            if schedule is None:
+                self.misses += 1
+                return None
+
+            if next(reversed(entries)) != key:
+                entries.move_to_end(key)
+                self._save(entries)
+
+        self.hits += 1
+
+        return schedule
+
+    def put(self, key: str, schedule: Dict) -> None:
+        """
+        Store the schedule of the key, evicting the least recently used ones.
+        """
+
+        with self._lock():
+            entries = self._load()
+            entries.pop(key, None)
+            entries[key] = schedule
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            self._save(entries)
+
+    def clear(self) -> None:
+        with self._lock():
+            self._save(OrderedDict())
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    @contextmanager
+    def _lock(self) -> Iterator[None]:
+        """
+        Exclusive lock of the cache file between processes, for a read-modify-write.
+        """
+
+        if fcntl is None:
+            yield
+            return
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path + ".lock", "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _load(self) -> "OrderedDict[str, Dict]":
+        try:
+            with open(self.path, "r") as f:
+                return OrderedDict(json.load(f))
+        except (OSError, ValueError):
+            # A missing or broken cache file is just an empty cache
+            return OrderedDict()
+
+    def _save(self, entries: "OrderedDict[str, Dict]") -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        # Write to a temporary file and replace, so that a reader never sees a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(list(entries.items()), f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
@@ -0,0 +1,281 @@
+# Copyright 2021 Kotaro Terada
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .floorplan import Floorplan
+from .problem import Problem
+from .sequence_pair import SequencePair
+from .solution import Solution
+from .vectorized import decode_batch
+
+
+class Seeder:
+    """
+    Constructive placements of a problem, to seed the annealing near a good layout.
+
+    The rectangles are packed into a strip whose width is the width limit, or is estimated from
+    the height limit or the total area. The pre-defined (fixed) blocks are not considered here,
+    the decoder of the sequence pair moves the rectangles around them.
+    """
+
+    # Seeding methods
+    METHODS = ("shelf", "skyline")
+
+    # Number of the candidate positions in each sequence to insert an added rectangle
+    INSERTION_CANDIDATES = 12
+
+    @classmethod
+    def seed(
+        cls,
+        problem: Problem,
+        method: str = "skyline",
+        width_limit: Optional[float] = None,
+        height_limit: Optional[float] = None,
+    ) -> Tuple[List[int], List[int], List[int]]:
+        """
+        Seed G_{+}, G_{-}, and rotations from a constructive placement (encoded by SequencePair.encode).
+        """
+
+        if not isinstance(problem, Problem):
+            raise TypeError("Invalid argument: 'problem' must be an instance of Problem.")
+
+        if method not in cls.METHODS:
+            raise ValueError("Invalid argument: 'method' must be one of " + str(cls.METHODS) + ".")
+
+        if method == "shelf":
+            floorplan = cls.shelf(problem, width_limit=width_limit, height_limit=height_limit)
+        else:
+            floorplan = cls.skyline(problem, width_limit=width_limit, height_limit=height_limit)
+
+        seqpair = SequencePair.encode(floorplan)
+        rotations = [
+            1 if (p["width"] != problem.widths[p["id"]]) or (p["height"] != problem.heights[p["id"]]) else 0
+            for p in sorted(floorplan.positions, key=lambda p: p["id"])
+        ]
+
+        return (list(seqpair.gp), list(seqpair.gn), rotations)
+
+    @classmethod
+    def from_solution(
+        cls, problem: Problem, solution: Solution, diff: Optional[Dict] = None
+    ) -> Tuple[List[int], List[int], List[int]]:
+        """
+        Map G_{+}, G_{-}, and rotations of a previous solution onto an edited problem, to warm-start the annealing.
+
+        'diff' tells the edit of the rectangles: "removed" is a list of the ids in the previous solution, and
+        "added" is a list of the ids in the problem. The other rectangles keep their order, i.e. the k-th kept id of
+        the previous solution is the k-th id of the problem which is not added, and a resized rectangle keeps its id.
+        Each added rectangle is inserted at the positions in G_{+} and G_{-} with the smallest area (evaluated by
+        decode_batch among INSERTION_CANDIDATES positions in each sequence).
+        """
+
+        if not isinstance(problem, Problem):
+            raise TypeError("Invalid argument: 'problem' must be an instance of Problem.")
+
+        if not isinstance(solution, Solution):
+            raise TypeError("Invalid argument: 'solution' must be an instance of Solution.")
+
+        diff = diff if diff is not None else {}
+        removed = set(diff.get("removed", []))
+        added = set(diff.get("added", []))
+
+        old_n = solution.sequence_pair.n
+        if not all(0 <= i < old_n for i in removed):
+            raise ValueError("Invalid argument: 'removed' ids must be the ids of the previous solution.")
+        if not all(0 <= i < problem.n for i in added):
+            raise ValueError("Invalid argument: 'added' ids must be the ids of the problem.")
+        if old_n - len(removed) + len(added) != problem.n:
+            raise ValueError("The previous solution with the diff must have 'problem.n' rectangles.")
+
+        # Old id -> new id
+        kept = [i for i in range(problem.n) if i not in added]
+        mapping = dict(zip([i for i in range(old_n) if i not in removed], kept))
+
+        # Rotations of the previous solution, or guessed from the placed sizes if they were not kept
+        rotations = [0 for _ in range(problem.n)]
+        for p in solution.floorplan.positions:
+            if p["id"] not in mapping:
+                continue
+            i = mapping[p["id"]]
+            if solution.rotations is not None:
+                rotated = solution.rotations[p["id"]] % 2 == 1
+            else:
+                width, height = problem.widths[i], problem.heights[i]
+                rotated = (width != height) and ((p["width"], p["height"]) == (height, width))
+            rotations[i] = 1 if (rotated and problem.rotatable[i]) else 0
+
+        # The added rectangles start on the right of all the others, then move to their best positions
+        gp = [mapping[i] for i in solution.sequence_pair.gp if i in mapping] + sorted(added)
+        gn = [mapping[i] for i in solution.sequence_pair.gn if i in mapping] + sorted(added)
+        for b in sorted(added):
+            gp, gn = cls._insert(problem, gp, gn, rotations, b)
+
+        return (gp, gn, rotations)
+
+    @classmethod
+    def _insert(
+        cls, problem: Problem, gp: List[int], gn: List[int], rotations: List[int], b: int
+    ) -> Tuple[List[int], List[int]]:
+        """
+        Move the rectangle b to the positions in G_{+} and G_{-} with the smallest area.
+        """
+
+        rest_p = [i for i in gp if i != b]
+        rest_n = [i for i in gn if i != b]
+        positions = sorted(set(np.linspace(0, len(rest_p), min(cls.INSERTION_CANDIDATES, len(rest_p) + 1)).astype(int)))
+
+        candidates = [
+            (rest_p[:i] + [b] + rest_p[i:], rest_n[:j] + [b] + rest_n[j:]) for i in positions for j in positions
+        ]
+        areas = decode_batch(problem, [p + n + rotations for p, n in candidates])["areas"]
+
+        return candidates[int(np.argmin(areas))]
+
+    @classmethod
+    def shelf(
+        cls, problem: Problem, width_limit: Optional[float] = None, height_limit: Optional[float] = None
+    ) -> Floorplan:
+        """
+        Shelf packing: the rectangles sorted by area (descending) are placed on the first shelf (a row of the strip)
+        where they fit, or on a new shelf on top. Rotatable rectangles are laid down (width >= height) if they fit.
+        """
+
+        strip_width = cls._strip_width(problem, width_limit, height_limit)
+
+        shelves: List[List] = []  # [bottom, height, used width]
+        top = 0
+        positions = []
+        for i in cls._order(problem):
+            width, height = problem.widths[i], problem.heights[i]
+            if problem.rotatable[i] and (width < height) and (height <= strip_width):
+                width, height = height, width
+
+            for shelf in shelves:
+                if (shelf[2] + width <= strip_width) and (height <= shelf[1]):
+                    break
+            else:
+                shelf = [top, height, 0]
+                shelves.append(shelf)
+                top += height
+
+            positions.append({"id": i, "x": shelf[2], "y": shelf[0], "width": width, "height": height})
+            shelf[2] += width
+
+        return cls._floorplan(positions)
+
+    @classmethod
+    def skyline(
+        cls, problem: Problem, width_limit: Optional[float] = None, height_limit: Optional[float] = None
+    ) -> Floorplan:
+        """
+        Skyline (bottom-left) packing: the rectangles sorted by area (descending) are placed, in the orientation
+        and at the position with the lowest top edge (then the leftmost), on the skyline of the placed ones.
+        """
+
+        strip_width = cls._strip_width(problem, width_limit, height_limit)
+
+        skyline: List[List] = [[0, 0, strip_width]]  # segments [x, y, width] from left to right
+        positions = []
+        for i in cls._order(problem):
+            orientations = [(problem.widths[i], problem.heights[i])]
+            if problem.rotatable[i] and (problem.widths[i] != problem.heights[i]):
+                orientations.append((problem.heights[i], problem.widths[i]))
+
+            best = None
+            for width, height in orientations:
+                for s in range(len(skyline)):
+                    x = skyline[s][0]
+                    if x + width > strip_width:
+                        break
+
+                    # The bottom is the highest segment under the rectangle
+                    y = 0
+                    for segment in skyline[s:]:
+                        if segment[0] >= x + width:
+                            break
+                        y = max(y, segment[1])
+
+                    if (best is None) or ((y + height, x) < (best[1] + best[3], best[0])):
+                        best = (x, y, width, height)
+
+            x, y, width, height = best
+            positions.append({"id": i, "x": x, "y": y, "width": width, "height": height})
+            cls._raise_skyline(skyline, x, y + height, width)
+
+        return cls._floorplan(positions)
+
+    @classmethod
+    def _raise_skyline(cls, skyline: List[List], x: float, y: float, width: float) -> None:
+        """
+        Raise the skyline to y over (x, x + width), and merge the neighbouring segments of the same height.
+        """
+
+        right = x + width
+        segments = []
+        for segment in skyline:
+            segment_right = segment[0] + segment[2]
+            if (segment_right <= x) or (segment[0] >= right):
+                segments.append(segment)
+                continue
+            # Keep the parts of the segment out of (x, right)
+            if segment[0] < x:
+                segments.append([segment[0], segment[1], x - segment[0]])
+            if segment_right > right:
+                segments.append([right, segment[1], segment_right - right])
+        segments.append([x, y, width])
+        segments.sort()
+
+        skyline[:] = []
+        for segment in segments:
+            if skyline and (skyline[-1][1] == segment[1]):
+                skyline[-1][2] += segment[2]
+            else:
+                skyline.append(segment)
+
+    @classmethod
+    def _strip_width(cls, problem: Problem, width_limit: Optional[float], height_limit: Optional[float]) -> float:
+        """
+        Width of the strip: the width limit, the total area over the height limit, or the square root of the total area,
+        but not less than the least possible width of every rectangle.
+        """
+
+        min_width = max(
+            [min(w, h) if rot else w for w, h, rot in zip(problem.widths, problem.heights, problem.rotatable)],
+            default=0,
+        )
+        area = sum(w * h for w, h in zip(problem.widths, problem.heights))
+
+        if width_limit:
+            return max(width_limit, min_width)
+        if height_limit:
+            return max(area / height_limit, min_width)
+
+        return max(math.sqrt(area), min_width)
+
+    @classmethod
+    def _order(cls, problem: Problem) -> List[int]:
+        return sorted(range(problem.n), key=lambda i: (-problem.widths[i] * problem.heights[i], i))
+
+    @classmethod
+    def _floorplan(cls, positions: List[Dict]) -> Floorplan:
+        bounding_box = (
+            max([p["x"] + p["width"] for p in positions], default=0),
+            max([p["y"] + p["height"] for p in positions], default=0),
+        )
+
+        return Floorplan(positions=positions, bounding_box=bounding_box)
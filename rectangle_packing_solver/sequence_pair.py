@@ -13,23 +13,45 @@
 # limitations under the License.
 
 import graphlib
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
+from .fixed_block_index import FixedBlockIndex
 from .floorplan import Floorplan
+from .lcs import longest_paths
 from .problem import Problem
 
 
 class ObliqueGrid:
-    def __init__(self, grid: List[List[int]], coordinates: List[Dict]) -> None:
-        self.grid = grid
+    """
+    A class of Oblique-grid. The n x n grid is built lazily from the coordinates, only when it is used.
+    """
+
+    def __init__(self, grid: Optional[List[List[int]]] = None, coordinates: Optional[List[Dict]] = None) -> None:
+        if (grid is None) and (coordinates is None):
+            raise ValueError("Invalid argument: either 'grid' or 'coordinates' must be given.")
+
+        self._grid = grid
         self.coordinates = coordinates
 
+    @property
+    def grid(self) -> List[List[int]]:
+        if self._grid is None:
+            n = len(self.coordinates)
+            self._grid = [[-1 for _ in range(n)] for _ in range(n)]
+            for i, c in enumerate(self.coordinates):
+                self._grid[c["a"]][c["b"]] = i
+
+        return self._grid
+
 
 class SequencePair:
     """
     A class of Sequence-Pair.
     """
 
+    # Decoding engines
+    ENGINES = ("graph", "lcs")
+
     def __init__(self, pair: Tuple[List, List] = ([], [])) -> None:
         if not isinstance(pair, tuple):
             raise TypeError("Invalid argument: 'pair' must be a tuple.")
@@ -44,13 +66,26 @@ class SequencePair:
             raise ValueError("Lists in the pair must be the same length.")
         self.n = len(self.gp)
 
-        self.oblique_grid = self.pair_to_obliquegrid(pair=self.pair)
+        # Positions of each rectangle in G_{+} and G_{-} (inverse permutations)
+        self.pos_p, self.pos_n = self.pair_to_positions(pair=self.pair)
+        self._oblique_grid: Optional[ObliqueGrid] = None
+
+    @property
+    def oblique_grid(self) -> ObliqueGrid:
+        if self._oblique_grid is None:
+            self._oblique_grid = ObliqueGrid(coordinates=self.positions_to_coordinates(self.pos_p, self.pos_n))
+
+        return self._oblique_grid
 
-    def decode(self, problem: Problem, rotations: Optional[List] = None) -> Floorplan:
+    def decode(self, problem: Problem, rotations: Optional[List] = None, engine: str = "graph") -> Floorplan:
         """
         Decode:
             Based on the sequence pair and the problem with rotations information, calculate a floorplan
             (bounding box, area, and rectangle positions).
+
+            The longest paths are calculated by the given engine, both of them return the same floorplan:
+                "graph": builds the constraint graphs explicitly, O(n^2).
+                "lcs": weighted longest common subsequence (FAST-SP), O(n log n).
         """
 
         if not isinstance(problem, Problem):
@@ -63,29 +98,66 @@ class SequencePair:
             if len(rotations) != self.n:
                 raise ValueError("'rotations' length must be the same as the sequence-pair length.")
 
-        coords = self.oblique_grid.coordinates
+        if engine not in self.ENGINES:
+            raise ValueError("Invalid argument: 'engine' must be one of " + str(self.ENGINES) + ".")
 
         # Width and height dealing with rotations
-        width_wrot = []
-        height_wrot = []
+        if rotations is not None:
+            assert all(rotation % 2 == 0 or problem.rotatable[i] for i, rotation in enumerate(rotations))
+        width_wrot, height_wrot = problem.dimensions(rotations)
+
+        if engine == "graph":
+            dist_h, dist_v = self._longest_paths_graph(
+                widths=width_wrot, heights=height_wrot, fixed_index=problem.fixed_block_index
+            )
+        else:
+            dist_h, dist_v = longest_paths(
+                gp=self.gp,
+                gn=self.gn,
+                widths=width_wrot,
+                heights=height_wrot,
+                fixed_index=problem.fixed_block_index,
+                pos_p=self.pos_p,
+                pos_n=self.pos_n,
+            )
+
+        bb_width = max(dist_h)
+        bb_height = max(dist_v)
+
+        # Calculate bottom-left positions
+        positions = []
         for i in range(self.n):
-            if (rotations is None) or (rotations[i] % 2 == 0):
-                # no rotation
-                width_wrot.append(problem.rectangles[i]["width"])
-                height_wrot.append(problem.rectangles[i]["height"])
-            else:
-                # with rotation
-                assert problem.rectangles[i]["rotatable"]
-                width_wrot.append(problem.rectangles[i]["height"])
-                height_wrot.append(problem.rectangles[i]["width"])
+            positions.append(
+                {
+                    "id": i,
+                    "x": dist_h[i] - width_wrot[i],  # distance from left edge
+                    "y": dist_v[i] - height_wrot[i],  # distance from bottom edge
+                    "width": width_wrot[i],
+                    "height": height_wrot[i],
+                }
+            )
+
+        return Floorplan(bounding_box=(bb_width, bb_height), positions=positions)
+
+    def _longest_paths_graph(
+        self, widths: Sequence, heights: Sequence, fixed_index: Optional[FixedBlockIndex]
+    ) -> Tuple[List, List]:
+        """
+        Calculate the right edges (dist_h) and the top edges (dist_v) of all blocks
+        by building the horizontal and vertical constraint graphs explicitly.
+        """
+
+        n = self.n
+        pos_p = self.pos_p
+        pos_n = self.pos_n
 
         # Calculate the longest path in the "Horizontal Constraint Graph" (G_h)
         # This time complexity is O(n^2), may be optimized...
-        graph_h: Dict[int, List] = {i: [] for i in range(self.n)}
-        for i in range(self.n):
-            for j in range(self.n):
+        graph_h: Dict[int, List] = {i: [] for i in range(n)}
+        for i in range(n):
+            for j in range(n):
                 # When j is right of i, set an edge from j to i
-                if (coords[i]["a"] < coords[j]["a"]) and (coords[i]["b"] < coords[j]["b"]):
+                if (pos_p[i] < pos_p[j]) and (pos_n[i] < pos_n[j]):
                     graph_h[j].append(i)
 
         # Topological order of DAG (G_h)
@@ -93,17 +165,17 @@ class SequencePair:
         torder_h = list(topo_h.static_order())
 
         # Calculate W (bounding box width) from G_h
-        dist_h = [width_wrot[i] for i in range(self.n)]
+        dist_h = [widths[i] for i in range(n)]
         for i in torder_h:
             dist_h[i] += max([dist_h[e] for e in graph_h[i]], default=0)
 
         # Calculate the longest path in the "Vertical Constraint Graph" (G_v)
         # This time complexity is O(n^2), may be optimized...
-        graph_v: Dict[int, List] = {i: [] for i in range(self.n)}
-        for i in range(self.n):
-            for j in range(self.n):
+        graph_v: Dict[int, List] = {i: [] for i in range(n)}
+        for i in range(n):
+            for j in range(n):
                 # When j is above i, set an edge from j to i
-                if (coords[i]["a"] > coords[j]["a"]) and (coords[i]["b"] < coords[j]["b"]):
+                if (pos_p[i] > pos_p[j]) and (pos_n[i] < pos_n[j]):
                     graph_v[j].append(i)
 
         # Topological order of DAG (G_v)
@@ -111,76 +183,118 @@ class SequencePair:
         torder_v = list(topo_v.static_order())
 
         # Calculate H (bounding box height) from G_v
-        dist_v = [height_wrot[i] for i in range(self.n)]
+        dist_v = [heights[i] for i in range(n)]
         for i in torder_v:
             dist_v[i] += max([dist_v[e] for e in graph_v[i]], default=0)
 
         # Consider the pre defined(fixed) blocks
-        for i in torder_h:
-            left = max([dist_h[e] for e in graph_h[i]], default=0)
-            right = left + width_wrot[i]
-            top = dist_v[i]
-            bottom = top - height_wrot[i]
-
-            for fixed_block in problem.fixed_blocks:
-                # check if the current block is overlapped with the fixed block, if yes, will move to the right
-                if (left < fixed_block["right"]) and (right > fixed_block["left"]) \
-                        and (top > fixed_block["bottom"]) and (bottom < fixed_block["top"]):
-                    left = fixed_block["right"]
-                    right = left + width_wrot[i]
+        # The block is moved to the right if it is overlapped, so recalculate the right edges in the topological order
+        if fixed_index:
+            for i in torder_h:
+                left = max([dist_h[e] for e in graph_h[i]], default=0)
+                top = dist_v[i]
+                left = fixed_index.legalize(left, widths[i], top - heights[i], top)
+                dist_h[i] = left + widths[i]
 
-            dist_h[i] = right
+        return (dist_h, dist_v)
 
-        bb_width = max(dist_h)
-        bb_height = max(dist_v)
-
-        # Calculate bottom-left positions
-        positions = []
-        for i in range(self.n):
-            positions.append(
-                {
-                    "id": i,
-                    "x": dist_h[i] - width_wrot[i],  # distance from left edge
-                    "y": dist_v[i] - height_wrot[i],  # distance from bottom edge
-                    "width": width_wrot[i],
-                    "height": height_wrot[i],
-                }
-            )
-
-        return Floorplan(bounding_box=(bb_width, bb_height), positions=positions)
-
-    def encode(self) -> None:
+    @classmethod
+    def encode(cls, placement: Union[Floorplan, List[Dict]]) -> "SequencePair":
         """
         Encode:
-            TODO
+            Based on a placement (a floorplan, or a list of rectangle positions with id, x, y, width, and height)
+            without overlaps, calculate a sequence pair which keeps a relation (left-of, right-of, above, or below)
+            of the placement for every pair of rectangles. So, the decoded floorplan places each rectangle
+            at the same position or at the left/bottom of it.
+
+            An order of a pair in a sequence is forced if all the relations of the pair agree on it:
+                a is left of b: a is before b in both G_{+} and G_{-}.
+                a is above b: a is before b in G_{+}, and after b in G_{-}.
+            G_{+} and G_{-} are topological orders of the forced orders, O(n^2).
         """
-        raise NotImplementedError()
+
+        positions = placement.positions if isinstance(placement, Floorplan) else placement
+        if not isinstance(positions, list):
+            raise TypeError("Invalid argument: 'placement' must be a Floorplan or a list of positions.")
+
+        n = len(positions)
+        rects = [(-1.0, -1.0, -1.0, -1.0) for _ in range(n)]  # (left, bottom, right, top)
+        for p in positions:
+            if not (0 <= p["id"] < n):
+                raise ValueError("Rectangle ids in the placement must be from 0 to n - 1.")
+            rects[p["id"]] = (p["x"], p["y"], p["x"] + p["width"], p["y"] + p["height"])
+
+        # Predecessors of each rectangle in G_{+} and G_{-}
+        graph_p: Dict[int, List] = {i: [] for i in range(n)}
+        graph_n: Dict[int, List] = {i: [] for i in range(n)}
+        for a in range(n):
+            for b in range(a + 1, n):
+                a_left = rects[a][2] <= rects[b][0]
+                b_left = rects[b][2] <= rects[a][0]
+                a_above = rects[a][1] >= rects[b][3]
+                b_above = rects[b][1] >= rects[a][3]
+                if not (a_left or b_left or a_above or b_above):
+                    raise ValueError("Rectangles in the placement must not overlap.")
+
+                # G_{+}: a is before b if a is left of or above b
+                if (a_left or a_above) and not (b_left or b_above):
+                    graph_p[b].append(a)
+                elif (b_left or b_above) and not (a_left or a_above):
+                    graph_p[a].append(b)
+
+                # G_{-}: a is before b if a is left of or below b
+                if (a_left or b_above) and not (b_left or a_above):
+                    graph_n[b].append(a)
+                elif (b_left or a_above) and not (a_left or b_above):
+                    graph_n[a].append(b)
+
+        gp = list(graphlib.TopologicalSorter(graph_p).static_order())
+        gn = list(graphlib.TopologicalSorter(graph_n).static_order())
+
+        return cls(pair=(gp, gn))
 
     def __repr__(self) -> str:
         return "SequencePair(" + str(self.pair) + ")"
 
     @classmethod
-    def pair_to_obliquegrid(cls, pair: Tuple[List, List]) -> ObliqueGrid:
+    def pair_to_positions(cls, pair: Tuple[List, List]) -> Tuple[List[int], List[int]]:
         """
-        Convert a Sequence-pair (a tuple of G_{+} and G_{-}) to Oblique-grid.
+        Convert a Sequence-pair to the positions of each rectangle in G_{+} and G_{-} (inverse permutations).
         """
 
         n = len(pair[0])
-        gp = pair[0]
-        gn = pair[1]
+        pos_p = [-1 for _ in range(n)]
+        pos_n = [-1 for _ in range(n)]
 
-        # Oblique grid is basically an n x n 2d array
-        grid = [[-1 for _ in range(n)] for _ in range(n)]
-        coordinates = [{"a": -1, "b": -1} for _ in range(n)]
+        try:
+            for k in range(n):
+                pos_p[pair[0][k]] = k
+                pos_n[pair[1][k]] = k
+        except IndexError:
+            raise ValueError("Lists in the pair must be permutations of the rectangle ids.")
 
-        # This time complexity is O(n^2), may be optimized...
-        for i in range(n):
-            index_p = gp.index(i)
-            index_n = gn.index(i)
-            grid[index_p][index_n] = i
-            coordinates[i] = {"a": index_p, "b": index_n}
+        if (-1 in pos_p) or (-1 in pos_n):
+            raise ValueError("Lists in the pair must be permutations of the rectangle ids.")
+
+        return (pos_p, pos_n)
+
+    @classmethod
+    def positions_to_coordinates(cls, pos_p: List[int], pos_n: List[int]) -> List[Dict]:
+        """
+        Convert the positions in G_{+} and G_{-} to the coordinates in Oblique-grid.
+        """
+
+        return [{"a": index_p, "b": index_n} for index_p, index_n in zip(pos_p, pos_n)]
+
+    @classmethod
+    def pair_to_obliquegrid(cls, pair: Tuple[List, List]) -> ObliqueGrid:
+        """
+        Convert a Sequence-pair (a tuple of G_{+} and G_{-}) to Oblique-grid.
+        """
 
-        return ObliqueGrid(grid=grid, coordinates=coordinates)
+        pos_p, pos_n = cls.pair_to_positions(pair=pair)
+
+        return ObliqueGrid(coordinates=cls.positions_to_coordinates(pos_p, pos_n))
 
     @classmethod
     def obliquegrid_to_pair(cls, oblique_grid: ObliqueGrid) -> Tuple[List, List]:
@@ -188,11 +302,22 @@ class SequencePair:
         Convert an Oblique-grid to Sequence-pair (a tuple of G_{+} and G_{-}).
         """
 
+        if oblique_grid.coordinates is not None:
+            n = len(oblique_grid.coordinates)
+            gp = [-1 for _ in range(n)]  # G_{+}
+            gn = [-1 for _ in range(n)]  # G_{-}
+
+            for rectangle_id, c in enumerate(oblique_grid.coordinates):
+                gp[c["a"]] = rectangle_id
+                gn[c["b"]] = rectangle_id
+
+            return (gp, gn)
+
         n = len(oblique_grid.grid)
         gp = [-1 for _ in range(n)]  # G_{+}
         gn = [-1 for _ in range(n)]  # G_{-}
 
-        # This time complexity is O(n^2), may be optimized...
+        # This time complexity is O(n^2), only when the coordinates are not given
         for x in range(n):
             for y in range(n):
                 rectangle_id = oblique_grid.grid[x][y]
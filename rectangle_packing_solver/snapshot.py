@@ -0,0 +1,90 @@
+# Copyright 2021 Kotaro Terada
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Dict, List, Optional
+
+from .floorplan import Floorplan
+from .problem import Problem
+from .sequence_pair import SequencePair
+from .solution import Solution
+
+
+class Snapshot:
+    """
+    An improving solution reported by Solver.solve_iter.
+
+    Only the state of the annealing (G_{+} + G_{-} + rotations) is kept, and the floorplan is decoded
+    on the first access.
+    """
+
+    def __init__(
+        self,
+        problem: Problem,
+        state: List[int],
+        energy: float,
+        step: int,
+        elapsed: float,
+        decoder: str = "lcs",
+    ) -> None:
+
+        if not isinstance(problem, Problem):
+            raise TypeError("Invalid argument: 'problem' must be an instance of Problem.")
+
+        self.problem = problem
+        self.state = state
+
+        # Energy of the state (the area, or the penalized area beyond the width/height limits)
+        self.energy = energy
+
+        # Step of the annealing and elapsed time (seconds) since the start of the solve
+        self.step = step
+        self.elapsed = elapsed
+
+        self.decoder = decoder
+        self._floorplan: Optional[Floorplan] = None
+
+    @property
+    def sequence_pair(self) -> SequencePair:
+        n = self.problem.n
+        return SequencePair(pair=(self.state[0:n], self.state[n : 2 * n]))
+
+    @property
+    def rotations(self) -> List[int]:
+        n = self.problem.n
+        return self.state[2 * n : 3 * n]
+
+    @property
+    def floorplan(self) -> Floorplan:
+        if self._floorplan is None:
+            self._floorplan = self.sequence_pair.decode(
+                problem=self.problem, rotations=self.rotations, engine=self.decoder
+            )
+
+        return self._floorplan
+
+    def to_solution(self, statistics: Optional[Dict] = None) -> Solution:
+        """
+        Decode the snapshot into a Solution.
+        """
+
+        return Solution(
+            sequence_pair=self.sequence_pair,
+            floorplan=self.floorplan,
+            statistics=statistics,
+            lower_bound=self.problem.area_lower_bound,
+            rotations=self.rotations,
+        )
+
+    def __repr__(self) -> str:
+        return "Snapshot({'energy': " + str(self.energy) + ", 'step': " + str(self.step) + "})"
@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from typing import Dict, List, Optional, Union
+
 from .floorplan import Floorplan
 from .sequence_pair import SequencePair
 
@@ -21,7 +23,14 @@ class Solution:
     A class to represent a rectangle packing solution.
     """
 
-    def __init__(self, sequence_pair: SequencePair, floorplan: Floorplan) -> None:
+    def __init__(
+        self,
+        sequence_pair: SequencePair,
+        floorplan: Floorplan,
+        statistics: Optional[Dict] = None,
+        lower_bound: Optional[Union[int, float]] = None,
+        rotations: Optional[List[int]] = None,
+    ) -> None:
 
         if not isinstance(sequence_pair, SequencePair):
             raise TypeError("Invalid argument: 'sequence_pair' must be an instance of SequencePair.")
@@ -32,6 +41,28 @@ class Solution:
         self.sequence_pair = sequence_pair
         self.floorplan = floorplan
 
+        # Rotations of the rectangles (the state of the annealing), to warm-start a later solve
+        self.rotations = rotations
+
+        # Statistics of the solver (e.g. the annealing chains)
+        self.statistics = statistics if statistics is not None else {}
+
+        # Lower bound of the area (e.g. Problem.area_lower_bound)
+        self.lower_bound = lower_bound
+
+    @property
+    def gap(self) -> Optional[float]:
+        """
+        Relative gap of the area to the lower bound, (area - lower_bound) / lower_bound.
+        """
+
+        if self.lower_bound is None:
+            return None
+        if self.lower_bound <= 0:
+            return 0.0 if self.floorplan.area <= self.lower_bound else float("inf")
+
+        return (self.floorplan.area - self.lower_bound) / self.lower_bound
+
     def __repr__(self) -> str:
         s = "Solution({"
         s += "'sequence_pair': " + str(self.sequence_pair) + ", "
@@ -12,18 +12,28 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import math
 import os
 import random
 import signal
 import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import redirect_stderr
-from typing import List, Optional, Tuple
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple, Union
 
 import simanneal
 
+from . import lcs
+from .incremental import IncrementalEvaluator
 from .problem import Problem
+from .schedule_cache import ScheduleCache
+from .seeder import Seeder
 from .sequence_pair import SequencePair
+from .snapshot import Snapshot
 from .solution import Solution
+from .wirelength import Wirelength
 
 
 def exit_handler(signum, frame) -> None:  # type: ignore
@@ -48,38 +58,720 @@ class Solver:
         height_limit: Optional[float] = None,
         init_gp: Optional[List[int]] = None,
         init_gn: Optional[List[int]] = None,
+        init_rot: Optional[List[int]] = None,
+        init: Optional[str] = None,
+        previous: Optional[Solution] = None,
+        diff: Optional[Dict] = None,
+        warm_fraction: float = 0.1,
         simanneal_minutes: float = 0.1,
         simanneal_steps: int = 100,
+        decoder: str = "lcs",
+        incremental: bool = False,
+        n_starts: int = 1,
+        workers: Optional[int] = None,
+        seed: Optional[int] = None,
+        schedule: Union[str, Dict, None] = "auto",
+        replicas: int = 1,
+        schedule_cache: Optional[ScheduleCache] = None,
+        time_limit: Optional[float] = None,
+        stagnation_steps: Optional[int] = None,
+        target_gap: float = 0.0,
+        energy_cache_size: int = 0,
+        wirelength_weight: float = 1.0,
+        clusters: Union[int, List[List[int]], None] = None,
+        cancel_token: Optional[Any] = None,
     ) -> Solution:
+        """
+        Solve the problem by simulated annealing.
+
+        The annealing starts from init_gp, init_gn (the identity permutations by default), and init_rot (the rotations,
+        none by default), or from a constructive placement if 'init' is given ("shelf" or "skyline", see Seeder).
+
+        With a 'previous' solution and a 'diff' of the rectangles ({"removed": [old ids], "added": [new ids]},
+        see Seeder.from_solution), the sequence pair of the previous solution is mapped onto the problem,
+        and only the last (coldest) 'warm_fraction' of the annealing schedule runs: Tmax is lowered to
+        Tmin * (Tmax / Tmin) ** warm_fraction, and the steps are multiplied by warm_fraction.
+        "auto" is replaced by "fast" for a warm start, since its trial anneals would take longer than the anneal itself.
+
+        The annealing schedule is given by 'schedule':
+            "auto": estimated by simanneal's auto(), which runs trial anneals of simanneal_steps moves
+                    and then anneals for simanneal_minutes.
+            "fast": estimated statistically from one sample of simanneal_steps moves, the whole solve
+                    (including the calibration) fits in simanneal_minutes.
+            a dict: used as it is (see simanneal's set_schedule()).
+        The calibration time is reported in solution.statistics["calibration_seconds"].
+
+        With a 'schedule_cache', the schedule estimated by "auto" or "fast" is stored in the cache, keyed by
+        the fingerprint of the problem, and reused for similar problems without the calibration.
+        Whether the schedule was found is reported in solution.statistics["schedule_cache"] ("hit" or "miss").
+
+        With n_starts > 1, independent annealing chains run in a process pool of 'workers' processes
+        (default: one per CPU core, up to n_starts). Each chain has its own seed drawn from the master 'seed'
+        and its own initial permutation (the first chain starts from init_gp and init_gn), and all of them share
+        the schedule estimated once by simanneal's auto(). The best solution is returned, with the statistics
+        of every chain in solution.statistics["chains"].
+
+        With replicas > 1, the chain is replaced by replica exchange (parallel tempering): the replicas run at
+        a ladder of temperatures between the schedule's tmin and tmax in 'workers' processes (default: one per
+        replica) and swap their states periodically. The statistics are in solution.statistics["replicas"].
+
+        With a 'time_limit' (seconds), the solver returns the best solution found by the deadline:
+        the temperature follows the elapsed time instead of the step count, and the annealing stops at the deadline.
+        "auto" is replaced by the statistical estimation of "fast", so that the calibration fits in the time limit,
+        and the number of steps of a schedule is ignored. With n_starts > 1, the chains share the time limit
+        (run in rounds if there are more chains than workers).
+
+        An annealing chain (or the replicas, between their exchanges) stops early when the best area has not improved
+        for 'stagnation_steps' steps, or when its relative gap to the area lower bound of the problem
+        (Problem.area_lower_bound) is at most 'target_gap' (by default, only when the lower bound is reached). The reason of the stop is reported in
+        solution.statistics["stop_reason"], and the achieved gap in solution.gap.
+
+        With energy_cache_size > 0, the energies of up to that many recently visited states are memoized
+        (except with the incremental evaluator, which does not decode whole states). The hits and misses are
+        reported in solution.statistics["energy_cache"].
+
+        If the problem has nets, the energy is the area plus 'wirelength_weight' times the half-perimeter wirelength
+        (HPWL) of the nets, and the incremental evaluator is used, so that only the nets connected to the moved
+        rectangles are recomputed at each step. The HPWL of the solution is in solution.statistics["wirelength"].
+
+        With 'clusters', the problem is solved hierarchically: the rectangles are partitioned into clusters
+        (the number of clusters of similar sizes, or a list of lists of rectangle ids), each cluster is solved as
+        its own problem in a process pool of 'workers' processes, and the bounding boxes of the clusters are packed as
+        macro-rectangles (rotatable if all of their rectangles are) by a top-level solve with the fixed blocks.
+        The other options apply to every solve, and a 'time_limit' is shared by the two levels. The flattened solution
+        has the sequence pair composed in the top-level order, and the statistics of every cluster in
+        solution.statistics["clusters"].
+
+        With a 'cancel_token' (an object with is_set(), e.g. threading.Event), the solve stops as soon as the token is
+        set, from any thread, and returns the best solution found so far (statistics["cancelled"] is True).
+        The calibration and every annealing chain check the token. With the process pools ('n_starts', 'replicas',
+        'clusters'), the token must be shared between processes, i.e. a multiprocessing.Event.
+
+        The result is reproducible for a fixed 'seed' and 'schedule' (without 'time_limit'). When 'schedule' is not given,
+        the number of steps estimated by auto() depends on the measured speed of the machine.
+        """
+        generator = self._solve(
+            problem=problem,
+            width_limit=width_limit,
+            height_limit=height_limit,
+            init_gp=init_gp,
+            init_gn=init_gn,
+            init_rot=init_rot,
+            init=init,
+            previous=previous,
+            diff=diff,
+            warm_fraction=warm_fraction,
+            simanneal_minutes=simanneal_minutes,
+            simanneal_steps=simanneal_steps,
+            decoder=decoder,
+            incremental=incremental,
+            n_starts=n_starts,
+            workers=workers,
+            seed=seed,
+            schedule=schedule,
+            replicas=replicas,
+            schedule_cache=schedule_cache,
+            time_limit=time_limit,
+            stagnation_steps=stagnation_steps,
+            target_gap=target_gap,
+            energy_cache_size=energy_cache_size,
+            wirelength_weight=wirelength_weight,
+            clusters=clusters,
+            cancel_token=cancel_token,
+        )
+        while True:
+            try:
+                next(generator)
+            except StopIteration as stop:
+                return stop.value
+
+    def solve_iter(
+        self,
+        problem: Problem,
+        width_limit: Optional[float] = None,
+        height_limit: Optional[float] = None,
+        **kwargs: Any,
+    ) -> Generator[Snapshot, None, Solution]:
+        """
+        Solve the problem by simulated annealing, as a generator of the improving solutions.
+
+        Takes the same arguments as solve(), except 'n_starts', 'replicas', and 'clusters' (a single annealing chain).
+        A Snapshot is yielded for the initial state and each time the best energy improves, and its floorplan is
+        decoded only when it is accessed. The annealing is suspended while the consumer handles a snapshot, and stops
+        when the generator is closed. The final Solution (as solve() returns) is the return value of the generator.
+        """
+
+        return (
+            yield from self._solve(
+                problem, width_limit=width_limit, height_limit=height_limit, stream=True, **kwargs
+            )
+        )
+
+    def _solve(
+        self,
+        problem: Problem,
+        width_limit: Optional[float] = None,
+        height_limit: Optional[float] = None,
+        init_gp: Optional[List[int]] = None,
+        init_gn: Optional[List[int]] = None,
+        init_rot: Optional[List[int]] = None,
+        init: Optional[str] = None,
+        previous: Optional[Solution] = None,
+        diff: Optional[Dict] = None,
+        warm_fraction: float = 0.1,
+        simanneal_minutes: float = 0.1,
+        simanneal_steps: int = 100,
+        decoder: str = "lcs",
+        incremental: bool = False,
+        n_starts: int = 1,
+        workers: Optional[int] = None,
+        seed: Optional[int] = None,
+        schedule: Union[str, Dict, None] = "auto",
+        replicas: int = 1,
+        schedule_cache: Optional[ScheduleCache] = None,
+        time_limit: Optional[float] = None,
+        stagnation_steps: Optional[int] = None,
+        target_gap: float = 0.0,
+        energy_cache_size: int = 0,
+        wirelength_weight: float = 1.0,
+        clusters: Union[int, List[List[int]], None] = None,
+        cancel_token: Optional[Any] = None,
+        stream: bool = False,
+    ) -> Generator[Snapshot, None, Solution]:
+        """
+        Generator of solve() and solve_iter(), yielding the snapshots only if 'stream' is set.
+        """
+
         if not isinstance(problem, Problem):
             raise TypeError("Invalid argument: 'problem' must be an instance of Problem.")
 
+        if (init is not None) and (init not in Seeder.METHODS):
+            raise ValueError("Invalid argument: 'init' must be one of " + str(Seeder.METHODS) + ".")
+
+        if (init is not None) and ((init_gp is not None) or (init_gn is not None) or (init_rot is not None)):
+            raise ValueError("Invalid argument: 'init' cannot be used with 'init_gp', 'init_gn', or 'init_rot'.")
+
+        if (init_rot is not None) and (len(init_rot) != problem.n):
+            raise ValueError("Invalid argument: 'init_rot' must have 'problem.n' rotations.")
+
+        if previous is not None:
+            if not isinstance(previous, Solution):
+                raise TypeError("Invalid argument: 'previous' must be an instance of Solution.")
+            if (init is not None) or (init_gp is not None) or (init_gn is not None) or (init_rot is not None):
+                raise ValueError(
+                    "Invalid argument: 'previous' cannot be used with 'init', 'init_gp', 'init_gn', or 'init_rot'."
+                )
+            if not (0 < warm_fraction <= 1):
+                raise ValueError("Invalid argument: 'warm_fraction' must be in (0, 1].")
+            if schedule == "auto":
+                schedule = "fast"
+
+        if decoder not in SequencePair.ENGINES:
+            raise ValueError("Invalid argument: 'decoder' must be one of " + str(SequencePair.ENGINES) + ".")
+
+        if n_starts < 1:
+            raise ValueError("Invalid argument: 'n_starts' must be a positive integer.")
+
+        if replicas < 1:
+            raise ValueError("Invalid argument: 'replicas' must be a positive integer.")
+
+        if schedule is None:
+            schedule = "auto"
+        if isinstance(schedule, str) and (schedule not in ("auto", "fast")):
+            raise ValueError("Invalid argument: 'schedule' must be 'auto', 'fast', or a dict.")
+
+        if (n_starts > 1) and (replicas > 1):
+            raise ValueError("Invalid argument: 'n_starts' and 'replicas' cannot be used together.")
+
+        if (stagnation_steps is not None) and (stagnation_steps < 1):
+            raise ValueError("Invalid argument: 'stagnation_steps' must be a positive integer.")
+
+        if target_gap < 0:
+            raise ValueError("Invalid argument: 'target_gap' must be a non-negative number.")
+
+        if energy_cache_size < 0:
+            raise ValueError("Invalid argument: 'energy_cache_size' must be a non-negative integer.")
+
+        if wirelength_weight < 0:
+            raise ValueError("Invalid argument: 'wirelength_weight' must be a non-negative number.")
+
+        if (time_limit is not None) and (time_limit <= 0):
+            raise ValueError("Invalid argument: 'time_limit' must be a positive number.")
+        deadline = None
+        if time_limit is not None:
+            deadline = time.time() + time_limit
+            simanneal_minutes = time_limit / 60.0
+            if schedule == "auto":
+                schedule = "fast"
+
+        if (schedule_cache is not None) and (not isinstance(schedule_cache, ScheduleCache)):
+            raise TypeError("Invalid argument: 'schedule_cache' must be an instance of ScheduleCache.")
+
+        if stream and ((n_starts > 1) or (replicas > 1) or (clusters is not None)):
+            raise ValueError(
+                "Invalid argument: 'n_starts', 'replicas', and 'clusters' cannot be used with solve_iter()."
+            )
+
+        if clusters is not None:
+            if (init_gp is not None) or (init_gn is not None) or (init_rot is not None) or (previous is not None):
+                raise ValueError(
+                    "Invalid argument: 'clusters' cannot be used with 'init_gp', 'init_gn', 'init_rot', or 'previous'."
+                )
+            if (n_starts > 1) or (replicas > 1):
+                raise ValueError("Invalid argument: 'clusters' cannot be used with 'n_starts' or 'replicas'.")
+
+            options = {
+                "init": init,
+                "simanneal_minutes": simanneal_minutes,
+                "simanneal_steps": simanneal_steps,
+                "decoder": decoder,
+                "incremental": incremental,
+                "schedule": schedule,
+                "schedule_cache": schedule_cache,
+                "time_limit": time_limit,
+                "stagnation_steps": stagnation_steps,
+                "target_gap": target_gap,
+                "energy_cache_size": energy_cache_size,
+                "wirelength_weight": wirelength_weight,
+            }
+            return self._solve_hierarchical(
+                problem=problem,
+                clusters=clusters,
+                width_limit=width_limit,
+                height_limit=height_limit,
+                workers=workers,
+                seed=seed,
+                options=options,
+                cancel_token=cancel_token,
+            )
+
         # Initial state (= G_{+} + G_{-} + rotations)
+        if init_rot is None:
+            init_rot = [0 for _ in range(problem.n)]
+        else:
+            # Only the rotatable rectangles can be rotated
+            init_rot = [r if problem.rotatable[i] else 0 for i, r in enumerate(init_rot)]
+        if init is not None:
+            init_gp, init_gn, init_rot = Seeder.seed(
+                problem, method=init, width_limit=width_limit, height_limit=height_limit
+            )
+        elif previous is not None:
+            init_gp, init_gn, init_rot = Seeder.from_solution(problem, previous, diff=diff)
+
         if init_gp == None:
             init_gp = list(range(problem.n))
 
         if init_gn == None:
             init_gn = list(range(problem.n))
 
-        init_rot = [0 for _ in range(problem.n)]
         init_state = init_gp + init_gn + init_rot
 
-        # Get rid of output (stderr) from simanneal in this "with" block
-        rpp = RectanglePackingProblemAnnealer(
-            state=init_state, problem=problem, width_limit=width_limit, height_limit=height_limit
-        )
-        #signal.signal(signal.SIGINT, exit_handler)
-        with redirect_stderr(open(os.devnull, "w")):
-            rpp.copy_strategy = "slice"  # We use "slice" since the state is a list
-            rpp.set_schedule(rpp.auto(minutes=simanneal_minutes, steps=simanneal_steps))
-            final_state, _ = rpp.anneal()
+        annealer_args = {
+            "problem": problem,
+            "width_limit": width_limit,
+            "height_limit": height_limit,
+            "decoder": decoder,
+            "incremental": incremental,
+            "stagnation_steps": stagnation_steps,
+            "target_gap": target_gap,
+            "energy_cache_size": energy_cache_size,
+            "wirelength_weight": wirelength_weight,
+        }
+        statistics: Dict = {}
+
+        # simanneal uses the global random generator, seed it and restore it afterwards
+        random_state = random.getstate()
+        if seed is not None:
+            random.seed(seed)
+
+        start = time.time()
+        stderr = sys.stderr
+        try:
+            # Get rid of output (stderr) from simanneal in this "with" block
+            rpp = RectanglePackingProblemAnnealer(state=init_state, **annealer_args)
+            rpp.cancel_token = cancel_token
+            #signal.signal(signal.SIGINT, exit_handler)
+            with redirect_stderr(open(os.devnull, "w")):
+                rpp.copy_strategy = "slice"  # We use "slice" since the state is a list
+                calibration_start = time.time()
+                cache_key = None
+                if (schedule_cache is not None) and isinstance(schedule, str):
+                    cache_key = schedule_cache.fingerprint(
+                        problem,
+                        width_limit=width_limit,
+                        height_limit=height_limit,
+                        schedule=schedule,
+                        minutes=simanneal_minutes,
+                        steps=simanneal_steps,
+                        decoder=decoder,
+                        incremental=incremental,
+                        nets=len(problem.nets),
+                        wirelength_weight=wirelength_weight,
+                    )
+                    cached = schedule_cache.get(cache_key)
+                    statistics["schedule_cache"] = "miss" if cached is None else "hit"
+                    if cached is not None:
+                        schedule = cached
+
+                if schedule == "auto":
+                    schedule = rpp.auto(minutes=simanneal_minutes, steps=simanneal_steps)
+                elif schedule == "fast":
+                    schedule = rpp.estimate_schedule(
+                        minutes=simanneal_minutes, samples=simanneal_steps, deadline=deadline
+                    )
+                statistics["calibration_seconds"] = time.time() - calibration_start
+                # A schedule of a cancelled calibration is not cached
+                if (statistics.get("schedule_cache") == "miss") and (not rpp.cancelled()):
+                    schedule_cache.put(cache_key, schedule)
+
+                # Warm start: only the coldest part of the schedule
+                if previous is not None:
+                    schedule = dict(schedule)
+                    schedule["tmax"] = schedule["tmin"] * (schedule["tmax"] / schedule["tmin"]) ** warm_fraction
+                    schedule["steps"] = max(1, int(schedule["steps"] * warm_fraction))
+                statistics["schedule"] = schedule
+
+                if replicas > 1:
+                    rpp.set_schedule(schedule)
+                    tempering = simanneal.ParallelTempering(
+                        rpp,
+                        replicas=replicas,
+                        workers=workers,
+                        seed=random.randrange(2**32),
+                        time_limit=None if deadline is None else deadline - time.time(),
+                    )
+                    final_state, _ = tempering.run()
+                    statistics["replicas"] = {
+                        "temperatures": tempering.temperatures,
+                        "acceptance": tempering.acceptance,
+                        "exchange_rates": [
+                            e / a if a else 0.0 for e, a in zip(tempering.exchanges, tempering.exchange_attempts)
+                        ],
+                        "energy": tempering.best_energy,
+                        "elapsed": tempering.elapsed,
+                    }
+                    statistics["stop_reason"] = tempering.stop_reason
+                elif n_starts == 1:
+                    rpp.set_schedule(schedule)
+                    if deadline is not None:
+                        rpp.time_limit = deadline - time.time()
+                    for step, energy in rpp.anneal_iter():
+                        if stream:
+                            snapshot = Snapshot(
+                                problem=problem,
+                                state=rpp.copy_state(rpp.best_state),
+                                energy=energy,
+                                step=step,
+                                elapsed=time.time() - start,
+                                decoder=decoder,
+                            )
+                            # The consumer gets the original stderr while the annealing is suspended
+                            with redirect_stderr(stderr):
+                                yield snapshot
+                    final_state = rpp.best_state
+                    statistics["stop_reason"] = rpp.stop_reason
+                    if rpp.energy_cache is not None:
+                        statistics["energy_cache"] = rpp.energy_cache_statistics()
+
+            if n_starts > 1:
+                chains = self._run_chains(
+                    annealer_args=annealer_args,
+                    init_state=init_state,
+                    schedule=schedule,
+                    n_starts=n_starts,
+                    workers=workers,
+                    seed=seed,
+                    deadline=deadline,
+                    cancel_token=cancel_token,
+                )
+                final_state = min(chains, key=lambda c: c["energy"])["state"]
+                statistics["chains"] = [{k: v for k, v in c.items() if k != "state"} for c in chains]
+        finally:
+            if seed is not None:
+                random.setstate(random_state)
+
+        if (cancel_token is not None) and cancel_token.is_set():
+            statistics["cancelled"] = True
 
         # Convert simanneal's final_state to a Solution object
         gp, gn, rotations = rpp.retrieve_pairs(n=problem.n, state=final_state)
         seqpair = SequencePair(pair=(gp, gn))
-        floorplan = seqpair.decode(problem=problem, rotations=rotations)
+        floorplan = seqpair.decode(problem=problem, rotations=rotations, engine=decoder)
+        if problem.nets:
+            statistics["wirelength"] = Wirelength.hpwl(problem, floorplan.positions, rotations)
+
+        return Solution(
+            sequence_pair=seqpair,
+            floorplan=floorplan,
+            statistics=statistics,
+            lower_bound=problem.area_lower_bound,
+            rotations=rotations,
+        )
 
-        return Solution(sequence_pair=seqpair, floorplan=floorplan)
+    def _solve_hierarchical(
+        self,
+        problem: Problem,
+        clusters: Union[int, List[List[int]]],
+        width_limit: Optional[float],
+        height_limit: Optional[float],
+        workers: Optional[int],
+        seed: Optional[int],
+        options: Dict,
+        cancel_token: Optional[Any] = None,
+    ) -> Solution:
+        """
+        Solve the clusters (in a process pool if more than one worker is used), pack them by a top-level solve,
+        and flatten the result.
+        """
+
+        start = time.time()
+        groups = self.partition(problem, clusters)
+        master = random.Random(seed)
+
+        if workers is None:
+            workers = min(len(groups), os.cpu_count() or 1)
+
+        # A half of the time limit is for the clusters, in rounds of 'workers' clusters
+        cluster_options = dict(options, width_limit=width_limit, height_limit=height_limit)
+        time_limit = options["time_limit"]
+        if time_limit is not None:
+            cluster_options["time_limit"] = time_limit / 2 / math.ceil(len(groups) / max(workers, 1))
+
+        cluster_args = []
+        for group in groups:
+            # The nets within a cluster are kept, the nets between clusters are left to the final solution
+            local = {i: k for k, i in enumerate(group)}
+            subproblem = Problem(
+                rectangles=[(problem.widths[i], problem.heights[i], bool(problem.rotatable[i])) for i in group],
+                nets=[
+                    [(local[i], dx, dy) for i, dx, dy in net]
+                    for net in problem.nets
+                    if all(pin[0] in local for pin in net)
+                ],
+            )
+            cluster_args.append((subproblem, dict(cluster_options, seed=master.randrange(2**32))))
+
+        subsolutions = self._map(_solve_cluster, cluster_args, workers, cancel_token)
+
+        # Top level: the bounding boxes of the clusters are the macro-rectangles
+        macros = [
+            (*subsolution.floorplan.bounding_box, all(problem.rotatable[i] for i in group))
+            for group, subsolution in zip(groups, subsolutions)
+        ]
+        top_problem = Problem(rectangles=macros, fixed_blocks=problem.fixed_blocks)
+        top_options = dict(options)
+        if time_limit is not None:
+            top_options["time_limit"] = max(start + time_limit - time.time(), 0.001)
+        top = self.solve(
+            top_problem,
+            width_limit=width_limit,
+            height_limit=height_limit,
+            seed=master.randrange(2**32),
+            cancel_token=cancel_token,
+            **top_options,
+        )
+
+        # Compose the sequence pair: the clusters in the top-level order, and the rectangles in each cluster's order.
+        # A rotated macro transposes its cluster, i.e. G_{+} of the cluster is reversed and every rectangle is rotated.
+        gp: List[int] = []
+        gn: List[int] = []
+        rotations = [0 for _ in range(problem.n)]
+        for c in top.sequence_pair.gp:
+            order = subsolutions[c].sequence_pair.gp
+            if top.rotations[c] % 2 == 1:
+                order = order[::-1]
+            gp.extend(groups[c][i] for i in order)
+        for c in top.sequence_pair.gn:
+            gn.extend(groups[c][i] for i in subsolutions[c].sequence_pair.gn)
+        for c, (group, subsolution) in enumerate(zip(groups, subsolutions)):
+            for local, i in enumerate(group):
+                rotations[i] = (subsolution.rotations[local] + top.rotations[c]) % 2
+
+        seqpair = SequencePair(pair=(gp, gn))
+        floorplan = seqpair.decode(problem=problem, rotations=rotations, engine=options["decoder"])
+
+        statistics = {
+            "clusters": [
+                {
+                    "ids": group,
+                    "bounding_box": subsolution.floorplan.bounding_box,
+                    "statistics": subsolution.statistics,
+                }
+                for group, subsolution in zip(groups, subsolutions)
+            ],
+            "top": top.statistics,
+            "elapsed": time.time() - start,
+        }
+        if (cancel_token is not None) and cancel_token.is_set():
+            statistics["cancelled"] = True
+        if problem.nets:
+            statistics["wirelength"] = Wirelength.hpwl(problem, floorplan.positions, rotations)
+
+        return Solution(
+            sequence_pair=seqpair,
+            floorplan=floorplan,
+            statistics=statistics,
+            lower_bound=problem.area_lower_bound,
+            rotations=rotations,
+        )
+
+    @classmethod
+    def partition(cls, problem: Problem, clusters: Union[int, List[List[int]]]) -> List[List[int]]:
+        """
+        Partition the rectangles into clusters: the given number of clusters of similar areas,
+        or the given lists of rectangle ids.
+        """
+
+        if isinstance(clusters, int):
+            if clusters < 1:
+                raise ValueError("Invalid argument: 'clusters' must be a positive integer.")
+            order = sorted(range(problem.n), key=lambda i: (-problem.widths[i] * problem.heights[i], i))
+            size = max(1, math.ceil(problem.n / clusters))
+            return [sorted(order[k : k + size]) for k in range(0, problem.n, size)]
+
+        groups = [list(group) for group in clusters]
+        if any(len(group) == 0 for group in groups) or sorted(i for group in groups for i in group) != list(
+            range(problem.n)
+        ):
+            raise ValueError("Invalid argument: 'clusters' must be a partition of the rectangle ids.")
+
+        return groups
+
+    @classmethod
+    def _run_chains(
+        cls,
+        annealer_args: Dict,
+        init_state: List[int],
+        schedule: Dict,
+        n_starts: int,
+        workers: Optional[int],
+        seed: Optional[int],
+        deadline: Optional[float] = None,
+        cancel_token: Optional[Any] = None,
+    ) -> List[Dict]:
+        """
+        Run independent annealing chains, in a process pool if more than one worker is used.
+        With a deadline (time.time()), the remaining time is divided into rounds of 'workers' chains.
+        """
+
+        n = annealer_args["problem"].n
+        master = random.Random(seed)
+
+        chain_args = []
+        for chain in range(n_starts):
+            chain_seed = master.randrange(2**32)
+            state = init_state[:]
+            if chain > 0:
+                # Each chain starts from its own random permutation
+                chain_random = random.Random(chain_seed)
+                gp = state[0:n]
+                gn = state[n : 2 * n]
+                chain_random.shuffle(gp)
+                chain_random.shuffle(gn)
+                state = gp + gn + state[2 * n : 3 * n]
+            chain_args.append((annealer_args, state, schedule, chain_seed))
+
+        if workers is None:
+            workers = min(n_starts, os.cpu_count() or 1)
+
+        if deadline is not None:
+            rounds = math.ceil(n_starts / max(workers, 1))
+            time_limit = (deadline - time.time()) / rounds
+            chain_args = [args + (time_limit, deadline) for args in chain_args]
+
+        results = cls._map(_anneal_chain, chain_args, workers, cancel_token)
+
+        for chain, result in enumerate(results):
+            result["chain"] = chain
+
+        return results
+
+    @classmethod
+    def _map(cls, function: Callable, args: List[Tuple], workers: int, cancel_token: Optional[Any] = None) -> List:
+        """
+        Map the function over the arguments, in a process pool if more than one worker is used.
+        The cancellation token is given to the workers by _init_worker, since an Event cannot be pickled as an argument.
+        """
+
+        if workers <= 1:
+            previous = _init_worker(cancel_token)
+            try:
+                return [function(*a) for a in args]
+            finally:
+                _init_worker(previous)
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cancel_token,)) as executor:
+            return list(executor.map(function, *zip(*args)))
+
+
+# The cancellation token of the current worker process, set by _init_worker
+_worker_cancel_token: Optional[Any] = None
+
+
+def _init_worker(cancel_token: Optional[Any]) -> Optional[Any]:
+    """
+    Keep the cancellation token in the worker process, and return the previous one.
+    """
+
+    global _worker_cancel_token
+    previous = _worker_cancel_token
+    _worker_cancel_token = cancel_token
+
+    return previous
+
+
+def _solve_cluster(problem: Problem, options: Dict) -> Solution:
+    """
+    Solve a cluster of the hierarchical solve, in a worker process of Solver.solve.
+    """
+
+    return Solver().solve(problem, cancel_token=_worker_cancel_token, **options)
+
+
+def _anneal_chain(
+    annealer_args: Dict,
+    state: List[int],
+    schedule: Dict,
+    seed: int,
+    time_limit: Optional[float] = None,
+    deadline: Optional[float] = None,
+) -> Dict:
+    """
+    Run an annealing chain with its own seed, in a worker process of Solver.solve.
+    With a time limit, the chain also stops at the deadline (time.time()) of the whole solve.
+    """
+
+    # simanneal uses the global random generator, so the caller's state is restored (for a chain run in-process)
+    random_state = random.getstate()
+    random.seed(seed)
+    start = time.time()
+
+    try:
+        rpp = RectanglePackingProblemAnnealer(state=state, **annealer_args)
+        rpp.cancel_token = _worker_cancel_token
+        with redirect_stderr(open(os.devnull, "w")):
+            rpp.copy_strategy = "slice"
+            initial_energy = rpp.energy()
+            rpp.set_schedule(schedule)
+            if time_limit is not None:
+                rpp.time_limit = min(time_limit, deadline - time.time())
+            final_state, energy = rpp.anneal()
+    finally:
+        random.setstate(random_state)
+
+    result = {
+        "seed": seed,
+        "initial_energy": initial_energy,
+        "energy": energy,
+        "steps": rpp.steps,
+        "stop_reason": rpp.stop_reason,
+        "elapsed": time.time() - start,
+        "state": final_state,
+    }
+    if rpp.energy_cache is not None:
+        result["energy_cache"] = rpp.energy_cache_statistics()
+
+    return result
 
 
 class RectanglePackingProblemAnnealer(simanneal.Annealer):
@@ -87,22 +779,61 @@ class RectanglePackingProblemAnnealer(simanneal.Annealer):
     Annealer for the rectangle packing problem.
     """
 
+    # Modulus of the state hash (a Mersenne prime)
+    HASH_MODULUS = (1 << 61) - 1
+
     def __init__(
         self,
         state: List[int],
         problem: Problem,
         width_limit: Optional[float] = None,
         height_limit: Optional[float] = None,
+        decoder: str = "lcs",
+        incremental: bool = False,
+        stagnation_steps: Optional[int] = None,
+        target_gap: float = 0.0,
+        energy_cache_size: int = 0,
+        wirelength_weight: float = 1.0,
     ) -> None:
         self.seqpair = SequencePair()
         self.problem = problem
+        self.decoder = decoder
+
+        # The incremental evaluator follows the moves, instead of decoding the whole state every time.
+        # It is always used with nets, since it updates the wirelength of the nets connected to the moved blocks only.
+        self.incremental = incremental or bool(problem.nets)
+        self.wirelength_weight = wirelength_weight
+        self.evaluator: Optional[IncrementalEvaluator] = None
+        self._evaluated_state: Optional[List[int]] = None
+
+        # A rejected move is reverted by undo(), instead of copying the state on every step.
+        self.undo_moves = True
+        self._undo: Optional[Tuple] = None
+
+        # LRU cache of the energies of the recently visited states, keyed by a hash of the state.
+        # The hash is a random linear form of the state (with the rotations taken modulo 2), so a move updates it in O(1).
+        self.energy_cache: Optional[OrderedDict] = None
+        self.energy_cache_size = energy_cache_size
+        self.energy_cache_hits = 0
+        self.energy_cache_misses = 0
+        if (energy_cache_size > 0) and (not self.incremental):
+            self.energy_cache = OrderedDict()
+        hash_random = random.Random(problem.n)
+        self._hash_coefficients = [hash_random.randrange(1, self.HASH_MODULUS) for _ in range(3 * problem.n)]
+        self._hash = 0
+        self._hashed_state: Optional[List[int]] = None
+
+        # Early stopping: no improvement for stagnation_steps, or the gap to the area lower bound is small enough.
+        self.stagnation_steps = stagnation_steps
+        self.lower_bound = problem.area_lower_bound
+        self.target_gap = target_gap
 
         # The max possible width and height to deal with the size limit.
         self.max_possible_width = sum(
-            [max(r["width"], r["height"]) if r["rotatable"] else r["width"] for r in problem.rectangles]
+            [max(w, h) if rot else w for w, h, rot in zip(problem.widths, problem.heights, problem.rotatable)]
         )
         self.max_possible_height = sum(
-            [max(r["width"], r["height"]) if r["rotatable"] else r["height"] for r in problem.rectangles]
+            [max(w, h) if rot else h for w, h, rot in zip(problem.widths, problem.heights, problem.rotatable)]
         )
 
         self.width_limit = sys.float_info.max
@@ -119,20 +850,31 @@ class RectanglePackingProblemAnnealer(simanneal.Annealer):
         Move state (sequence-pair) and return the energy diff.
         """
 
-        initial_energy: float = self.energy()
-        initial_state: List[int] = self.state[:]
+        initial_energy: float = self.current_energy
+        if self.incremental:
+            self.sync_evaluator()
 
         # Choose two indices and swap them
         i, j = random.sample(range(self.problem.n), k=2)  # The first and second index
         offset = random.randint(0, 1) * self.problem.n  # Choose G_{+} (=0) or G_{-} (=1)
 
         # Swap them (i != j always holds true)
-        self.state[i + offset], self.state[j + offset] = initial_state[j + offset], initial_state[i + offset]
+        self.state[i + offset], self.state[j + offset] = self.state[j + offset], self.state[i + offset]
 
         # Random rotation
-        if self.problem.rectangles[i]["rotatable"]:
+        rotate = None
+        if self.problem.rotatable[i]:
             if random.randint(0, 1) == 1:
-                self.state[i + 2 * self.problem.n] = initial_state[i + 2 * self.problem.n] + 1
+                self.state[i + 2 * self.problem.n] += 1
+                rotate = i
+
+        # Undo token of this move
+        self._undo = (i, j, offset, rotate)
+        self.update_hash(i, j, offset, rotate)
+
+        if self.evaluator is not None:
+            self.evaluator.swap(i, j, sequence=offset // self.problem.n, rotate=rotate)
+            self._evaluated_state = self.state
 
         # A solution whose width/height limit is not satisfied has a larger energy.
         # We adopt a valid solution as the annealing steps proceeds.
@@ -140,25 +882,153 @@ class RectanglePackingProblemAnnealer(simanneal.Annealer):
 
         return energy - initial_energy
 
+    def undo(self) -> None:
+        """
+        Revert the last move (called by simanneal when the move is rejected).
+        """
+
+        if self._undo is None:
+            return
+
+        i, j, offset, rotate = self._undo
+        self._undo = None
+
+        self.state[i + offset], self.state[j + offset] = self.state[j + offset], self.state[i + offset]
+        if rotate is not None:
+            self.state[rotate + 2 * self.problem.n] -= 1
+        self.update_hash(i, j, offset, rotate)
+
+        if (self.evaluator is not None) and (self.state is self._evaluated_state):
+            self.evaluator.rollback()
+
     def energy(self) -> float:
         """
-        Calculates the area of bounding box.
+        Calculates the area of bounding box, plus the weighted wirelength of the nets
+        (memoized if the energy cache is enabled).
         """
 
-        # Pick up sequence-pair and rotations from state
-        gp, gn, rotations = self.retrieve_pairs(n=self.problem.n, state=self.state)
-        seqpair = SequencePair(pair=(gp, gn))
-        floorplan = seqpair.decode(problem=self.problem, rotations=rotations)
+        if self.energy_cache is None:
+            return self.decode_energy()
+
+        key = self.state_hash()
+        energy = self.energy_cache.get(key)
+        if energy is not None:
+            self.energy_cache_hits += 1
+            self.energy_cache.move_to_end(key)
+            return energy
+
+        self.energy_cache_misses += 1
+        energy = self.decode_energy()
+        self.energy_cache[key] = energy
+        if len(self.energy_cache) > self.energy_cache_size:
+            self.energy_cache.popitem(last=False)
+
+        return energy
+
+    def decode_energy(self) -> float:
+        """
+        Calculates the area of bounding box by decoding the state.
+        """
+
+        if self.incremental:
+            bounding_box = self.incremental_bounding_box()
+        elif self.decoder == "lcs":
+            # Only the bounding box is needed, the floorplan is built for the final solution.
+            # The decode stops early if the width/height limit is exceeded.
+            bounding_box = lcs.bounding_box(
+                problem=self.problem, state=self.state, width_limit=self.width_limit, height_limit=self.height_limit
+            )
+        else:
+            # Pick up sequence-pair and rotations from state
+            gp, gn, rotations = self.retrieve_pairs(n=self.problem.n, state=self.state)
+            seqpair = SequencePair(pair=(gp, gn))
+            floorplan = seqpair.decode(problem=self.problem, rotations=rotations, engine=self.decoder)
+            bounding_box = floorplan.bounding_box
 
         # Returns the max possible area, if width/height limit is not satisfied.
         # This solution could be chosen in the earlier steps of the annealing,
         # but would not be chosen in the later steps.
-        if floorplan.bounding_box[0] > self.width_limit:
+        if bounding_box[0] > self.width_limit:
             return self.max_possible_width * self.max_possible_height
-        if floorplan.bounding_box[1] > self.height_limit:
+        if bounding_box[1] > self.height_limit:
             return self.max_possible_width * self.max_possible_height
 
-        return float(floorplan.area)
+        if self.problem.nets:
+            return float(bounding_box[0] * bounding_box[1]) + self.wirelength_weight * self.evaluator.hpwl
+
+        return float(bounding_box[0] * bounding_box[1])
+
+    def state_hash(self) -> int:
+        """
+        Hash of the current state, recalculated if the state was replaced.
+        """
+
+        if self.state is not self._hashed_state:
+            n = self.problem.n
+            coefficients = self._hash_coefficients
+            h = 0
+            for k in range(2 * n):
+                h += coefficients[k] * self.state[k]
+            for k in range(2 * n, 3 * n):
+                h += coefficients[k] * (self.state[k] % 2)
+            self._hash = h % self.HASH_MODULUS
+            self._hashed_state = self.state
+
+        return self._hash
+
+    def update_hash(self, i: int, j: int, offset: int, rotate: Optional[int]) -> None:
+        """
+        Updates the hash after a swap (and a rotation) of the state, or after its undo.
+        """
+
+        if (self.energy_cache is None) or (self.state is not self._hashed_state):
+            return
+
+        coefficients = self._hash_coefficients
+        h = self._hash + (coefficients[i + offset] - coefficients[j + offset]) * (
+            self.state[i + offset] - self.state[j + offset]
+        )
+        if rotate is not None:
+            k = rotate + 2 * self.problem.n
+            h += coefficients[k] * (2 * (self.state[k] % 2) - 1)
+        self._hash = h % self.HASH_MODULUS
+
+    def energy_cache_statistics(self) -> Dict:
+        """
+        Hits, misses, and hit rate of the energy cache.
+        """
+
+        lookups = self.energy_cache_hits + self.energy_cache_misses
+        return {
+            "hits": self.energy_cache_hits,
+            "misses": self.energy_cache_misses,
+            "hit_rate": self.energy_cache_hits / lookups if lookups else 0.0,
+        }
+
+    def incremental_bounding_box(self) -> Tuple:
+        """
+        Calculates the bounding box with the incremental evaluator.
+        """
+
+        self.sync_evaluator()
+
+        return self.evaluator.bounding_box
+
+    def sync_evaluator(self) -> None:
+        """
+        Synchronizes the incremental evaluator with the current state.
+        """
+
+        if self.evaluator is None:
+            self.evaluator = IncrementalEvaluator(problem=self.problem, state=self.state)
+            self._evaluated_state = self.state
+        elif self.state is not self._evaluated_state:
+            # The state was replaced, e.g. simanneal restores a copy of the previous state without undo_moves,
+            # so roll the pending move back (or evaluate from scratch if it is another state).
+            self.evaluator.rollback()
+            if not self.evaluator.matches(self.state):
+                self.evaluator.load(self.state)
+            self._evaluated_state = self.state
 
     @classmethod
     def retrieve_pairs(cls, n: int, state: List[int]) -> Tuple[List[int], List[int], List[int]]:
@@ -0,0 +1,400 @@
+# Copyright 2021 Kotaro Terada
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+import time
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import simanneal
+
+from .problem import Problem
+from .sequence_pair import SequencePair
+from .solution import Solution
+
+
+# Number of visits whose Fenwick tree nodes are gathered at once (O(_CHUNK K log n) indices in memory)
+_CHUNK = 256
+
+
+def _fenwick_paths(n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Nodes visited by the prefix-maximum queries and updates of a Fenwick tree over the indices 1..n.
+
+    The row t of 'query' holds the nodes of the query of the prefix 1..t, padded with the node 0 (always zero),
+    and the row t of 'update' holds the nodes of the update at t, padded with the unused node n + 1.
+    """
+
+    depth = max(1, n.bit_length())
+    query = np.zeros((n + 1, depth), dtype=np.intp)
+    update = np.full((n + 2, depth), n + 1, dtype=np.intp)
+
+    t = np.arange(n + 1)
+    for d in range(depth):
+        query[:, d] = t
+        t = t - (t & -t)
+
+    t = np.arange(n + 2)
+    t[0] = n + 1
+    for d in range(depth):
+        update[:, d] = t
+        t = np.minimum(t + (t & -t), n + 1)
+
+    return (query, update)
+
+
+def _longest_paths(problem: Problem, states: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Calculate the longest paths of a batch of states (= G_{+} + G_{-} + rotations, one per row).
+
+    The blocks are visited in the order of a sequence with a Fenwick tree for prefix maximum, as the LCS decoder
+    does, but the K states are handled at once: each visit gathers and updates the O(log n) nodes of the K trees
+    in a few NumPy operations. The time complexity is O(K n log n), with O(n) Python-level iterations.
+
+    Returns the right edges (dist_h), the top edges (dist_v), the widths, and the heights of all blocks
+    as (K, n) arrays, indexed by the block id.
+    """
+
+    n = problem.n
+    k_states = states.shape[0]
+    rows = np.arange(k_states)[:, None]
+    index = np.arange(n)
+
+    gp = states[:, 0:n]
+    gn = states[:, n : 2 * n]
+    rotated = (states[:, 2 * n : 3 * n] % 2) == 1
+
+    # Width and height dealing with rotations, shared across the batch
+    base_widths = np.asarray(problem.widths)
+    base_heights = np.asarray(problem.heights)
+    widths = np.where(rotated, base_heights, base_widths)
+    heights = np.where(rotated, base_widths, base_heights)
+
+    # The edges can be pushed to the (float) edges of the fixed blocks
+    fixed_blocks = problem.fixed_block_index.blocks
+    dtype = np.result_type(widths, np.asarray(fixed_blocks)) if fixed_blocks else widths.dtype
+
+    pos_p = np.empty_like(gp)
+    pos_n = np.empty_like(gn)
+    pos_p[rows, gp] = index
+    pos_n[rows, gn] = index
+
+    # Fenwick trees of the K states in a flat array: the node t of the state c is at t * K + c
+    query, update = _fenwick_paths(n)
+    query = query.T * k_states
+    update = update.T * k_states
+    columns = np.arange(k_states)
+
+    # Vertical: visit G_{-} and query the blocks placed later in G_{+} (reversed index), one row per visit
+    r_seq = (n - 1 - np.take_along_axis(pos_p, gn, axis=1)).T
+    heights_seq = np.take_along_axis(heights, gn, axis=1).T
+    top_seq = np.empty((n, k_states), dtype=dtype)
+    tree = np.zeros((n + 2) * k_states, dtype=dtype)
+    for k in range(n):
+        c = k % _CHUNK
+        if c == 0:
+            # Nodes of the next visits
+            query_nodes = query[:, r_seq[k : k + _CHUNK]] + columns
+            update_nodes = update[:, r_seq[k : k + _CHUNK] + 1] + columns
+        y = tree.take(query_nodes[:, c]).max(axis=0) + heights_seq[k]
+        top_seq[k] = y
+        nodes = update_nodes[:, c]
+        tree[nodes] = np.maximum(tree.take(nodes), y)
+    dist_v = np.empty((k_states, n), dtype=dtype)
+    np.put_along_axis(dist_v, gn, top_seq.T, axis=1)
+
+    # Sweep of the pre-defined (fixed) blocks sorted by the left edge
+    if fixed_blocks:
+        tops = np.take_along_axis(dist_v, gp, axis=1).T
+        bottoms = tops - np.take_along_axis(heights, gp, axis=1).T
+
+    # Horizontal: visit G_{+} and query the blocks placed earlier in G_{-}
+    q_seq = np.take_along_axis(pos_n, gp, axis=1).T
+    widths_seq = np.take_along_axis(widths, gp, axis=1).T
+    right_seq = np.empty((n, k_states), dtype=dtype)
+    tree = np.zeros((n + 2) * k_states, dtype=dtype)
+    for k in range(n):
+        c = k % _CHUNK
+        if c == 0:
+            query_nodes = query[:, q_seq[k : k + _CHUNK]] + columns
+            update_nodes = update[:, q_seq[k : k + _CHUNK] + 1] + columns
+        left = tree.take(query_nodes[:, c]).max(axis=0)
+        width = widths_seq[k]
+
+        # The block is moved to the right past the fixed blocks it overlaps
+        if fixed_blocks:
+            top = tops[k]
+            bottom = bottoms[k]
+            for fixed_left, fixed_right, fixed_bottom, fixed_top in fixed_blocks:
+                overlap = (fixed_bottom < top) & (bottom < fixed_top) & (fixed_left < left + width) & (left < fixed_right)
+                left = np.where(overlap, fixed_right, left)
+
+        x = left + width
+        right_seq[k] = x
+        nodes = update_nodes[:, c]
+        tree[nodes] = np.maximum(tree.take(nodes), x)
+    dist_h = np.empty((k_states, n), dtype=dtype)
+    np.put_along_axis(dist_h, gp, right_seq.T, axis=1)
+
+    return (dist_h, dist_v, widths, heights)
+
+
+def decode_batch(
+    problem: Problem, states: Union[np.ndarray, Sequence], return_positions: bool = False
+) -> Dict[str, np.ndarray]:
+    """
+    Decode a batch of sequence pairs of the problem at once.
+
+    'states' is a stack of K states, either as a (K, 3n) array of G_{+} + G_{-} + rotations
+    or as a (K, 3, n) array of (G_{+}, G_{-}, rotations). Returns a dict of arrays:
+        "bounding_boxes": (K, 2) widths and heights of the bounding boxes.
+        "areas": (K,) areas of the bounding boxes.
+        "positions": (K, n, 4) x, y (bottom-left), width, and height of each rectangle, if return_positions is True.
+    The results are the same as the ones of SequencePair.decode, one state at a time.
+
+    The Python-level cost of a call is O(n) visits shared by the batch, so it pays off for batches of a few dozen
+    states or more; a few states are decoded faster one by one with lcs.bounding_box.
+    """
+
+    if not isinstance(problem, Problem):
+        raise TypeError("Invalid argument: 'problem' must be an instance of Problem.")
+
+    n = problem.n
+    states = np.asarray(states, dtype=np.int64)
+    if states.ndim == 3:
+        states = states.reshape(states.shape[0], -1)
+    if (states.ndim != 2) or (states.shape[1] != 3 * n):
+        raise ValueError("Invalid argument: 'states' must be of shape (K, 3n) or (K, 3, n).")
+
+    index = np.arange(n)
+    if not ((np.sort(states[:, 0:n], axis=1) == index).all() and (np.sort(states[:, n : 2 * n], axis=1) == index).all()):
+        raise ValueError("Lists in the pair must be permutations of the rectangle ids.")
+
+    rotatable = np.asarray(problem.rotatable, dtype=bool)
+    if ((states[:, 2 * n : 3 * n] % 2 == 1) & ~rotatable).any():
+        raise ValueError("Invalid argument: a rectangle which is not rotatable is rotated.")
+
+    dist_h, dist_v, widths, heights = _longest_paths(problem, states)
+    if n == 0:
+        bounding_boxes = np.zeros((states.shape[0], 2), dtype=dist_h.dtype)
+    else:
+        bounding_boxes = np.stack([dist_h.max(axis=1), dist_v.max(axis=1)], axis=1)
+
+    result = {
+        "bounding_boxes": bounding_boxes,
+        "areas": bounding_boxes[:, 0] * bounding_boxes[:, 1],
+    }
+    if return_positions:
+        result["positions"] = np.stack([dist_h - widths, dist_v - heights, widths, heights], axis=2)
+
+    return result
+
+
+class VectorizedSolver:
+    """
+    A rectangle packing solver running many annealing chains in lockstep with NumPy.
+
+    The K states are held in a (K, 3n) integer array. Every step makes one random move on each chain,
+    decodes all the proposals at once, and accepts or rejects them by a vectorized Metropolis test,
+    so the interpreter overhead of a step is shared by the K chains. The more chains, the more moves per second:
+    with a handful of chains, Solver (with incremental=True) evaluates moves faster.
+    """
+
+    def __init__(self) -> None:
+        pass
+
+    def solve(
+        self,
+        problem: Problem,
+        width_limit: Optional[float] = None,
+        height_limit: Optional[float] = None,
+        init_gp: Optional[List[int]] = None,
+        init_gn: Optional[List[int]] = None,
+        chains: int = 64,
+        steps: int = 1000,
+        schedule: Optional[Dict] = None,
+        samples: int = 100,
+        time_limit: Optional[float] = None,
+        seed: Optional[int] = None,
+    ) -> Solution:
+        """
+        Solve the problem by 'chains' annealing chains of 'steps' steps each.
+
+        The first chain starts from init_gp and init_gn, and the others from random permutations.
+        The temperatures are given by 'schedule' ("tmax" and "tmin"), or estimated from the energy deltas of
+        about 'samples' random moves (see simanneal.estimate_temperatures). With a 'time_limit' (seconds),
+        the temperature follows the elapsed time instead of the step count, and the annealing stops at the deadline.
+        The best solution over all the chains is returned.
+        """
+
+        if not isinstance(problem, Problem):
+            raise TypeError("Invalid argument: 'problem' must be an instance of Problem.")
+
+        if chains < 1:
+            raise ValueError("Invalid argument: 'chains' must be a positive integer.")
+
+        if steps < 0:
+            raise ValueError("Invalid argument: 'steps' must be a non-negative integer.")
+
+        if (time_limit is not None) and (time_limit <= 0):
+            raise ValueError("Invalid argument: 'time_limit' must be a positive number.")
+
+        start = time.time()
+        n = problem.n
+        rng = np.random.default_rng(seed)
+
+        # Initial states (= G_{+} + G_{-} + rotations)
+        if init_gp is None:
+            init_gp = list(range(n))
+        if init_gn is None:
+            init_gn = list(range(n))
+        states = np.zeros((chains, 3 * n), dtype=np.int64)
+        states[:, 0:n] = init_gp
+        states[:, n : 2 * n] = init_gn
+        if chains > 1:
+            states[1:, 0:n] = rng.permuted(states[1:, 0:n], axis=1)
+            states[1:, n : 2 * n] = rng.permuted(states[1:, n : 2 * n], axis=1)
+
+        # The max possible width and height to deal with the size limit
+        rotatable = np.asarray(problem.rotatable, dtype=bool)
+        longer = np.maximum(np.asarray(problem.widths), np.asarray(problem.heights))
+        penalty = float(
+            np.where(rotatable, longer, np.asarray(problem.widths)).sum()
+            * np.where(rotatable, longer, np.asarray(problem.heights)).sum()
+        )
+        limits = (width_limit, height_limit)
+
+        energies = self._energies(problem, states, limits, penalty)
+        best_states = states.copy()
+        best_energies = energies.copy()
+
+        total_steps = 0
+        if n >= 2:
+            # Temperatures
+            if schedule is None:
+                deltas = []
+                walk, walk_energies = states, energies
+                for _ in range(max(1, math.ceil(samples / chains))):
+                    proposals = self._move(problem, walk, rng)
+                    proposal_energies = self._energies(problem, proposals, limits, penalty)
+                    deltas.extend((proposal_energies - walk_energies).tolist())
+                    walk, walk_energies = proposals, proposal_energies
+                t_max, t_min = simanneal.estimate_temperatures(deltas)
+            else:
+                t_max, t_min = schedule["tmax"], schedule["tmin"]
+            if t_min <= 0.0:
+                raise ValueError("Invalid argument: the minimum temperature must be greater than zero.")
+            t_factor = -math.log(t_max / t_min)
+
+            anneal_start = time.time()
+            while True:
+                if time_limit is None:
+                    if total_steps >= steps:
+                        break
+                    fraction = (total_steps + 1) / steps
+                else:
+                    elapsed = time.time() - start
+                    if elapsed >= time_limit:
+                        break
+                    fraction = elapsed / time_limit
+                total_steps += 1
+                temperature = t_max * math.exp(t_factor * fraction)
+
+                proposals = self._move(problem, states, rng)
+                proposal_energies = self._energies(problem, proposals, limits, penalty)
+
+                # Metropolis acceptance of all the chains
+                delta = proposal_energies - energies
+                with np.errstate(over="ignore"):
+                    accepted = (delta <= 0.0) | (rng.random(chains) < np.exp(-delta / temperature))
+                states[accepted] = proposals[accepted]
+                energies[accepted] = proposal_energies[accepted]
+
+                improved = energies < best_energies
+                best_states[improved] = states[improved]
+                best_energies[improved] = energies[improved]
+            anneal_elapsed = time.time() - anneal_start
+        else:
+            t_max = t_min = None
+            anneal_elapsed = 0.0
+
+        # Decode the best state of all the chains
+        best = int(np.argmin(best_energies))
+        state = best_states[best].tolist()
+        seqpair = SequencePair(pair=(state[0:n], state[n : 2 * n]))
+        floorplan = seqpair.decode(problem=problem, rotations=state[2 * n : 3 * n], engine="lcs")
+
+        statistics = {
+            "chains": chains,
+            "steps": total_steps,
+            "schedule": {"tmax": t_max, "tmin": t_min, "steps": total_steps},
+            "energies": best_energies.tolist(),
+            "best_chain": best,
+            "moves_per_second": chains * total_steps / anneal_elapsed if anneal_elapsed > 0.0 else 0.0,
+            "elapsed": time.time() - start,
+        }
+
+        return Solution(
+            sequence_pair=seqpair,
+            floorplan=floorplan,
+            statistics=statistics,
+            lower_bound=problem.area_lower_bound,
+            rotations=state[2 * n : 3 * n],
+        )
+
+    @classmethod
+    def _move(cls, problem: Problem, states: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        """
+        Proposals of a random move on every chain: swap two entries of G_{+} or G_{-}, and randomly rotate a block.
+        """
+
+        n = problem.n
+        k_states = states.shape[0]
+        rows = np.arange(k_states)
+
+        # Choose two different indices of G_{+} (=0) or G_{-} (=1) and swap them
+        i = rng.integers(0, n, k_states)
+        j = (i + rng.integers(1, n, k_states)) % n
+        offset = rng.integers(0, 2, k_states) * n
+
+        proposals = states.copy()
+        proposals[rows, offset + i] = states[rows, offset + j]
+        proposals[rows, offset + j] = states[rows, offset + i]
+
+        # Random rotation
+        rotate = np.asarray(problem.rotatable, dtype=bool)[i] & (rng.integers(0, 2, k_states) == 1)
+        proposals[rows[rotate], 2 * n + i[rotate]] += 1
+
+        return proposals
+
+    @classmethod
+    def _energies(
+        cls, problem: Problem, states: np.ndarray, limits: Tuple[Optional[float], Optional[float]], penalty: float
+    ) -> np.ndarray:
+        """
+        Areas of the bounding boxes of the states, or the penalty if the width/height limit is not satisfied.
+        """
+
+        dist_h, dist_v, _, _ = _longest_paths(problem, states)
+        width = dist_h.max(axis=1)
+        height = dist_v.max(axis=1)
+        energies = (width * height).astype(np.float64)
+
+        width_limit, height_limit = limits
+        if width_limit:
+            energies[width > width_limit] = penalty
+        if height_limit:
+            energies[height > height_limit] = penalty
+
+        return energies
@@ -0,0 +1,136 @@
+# Copyright 2021 Kotaro Terada
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .problem import Problem
+
+
+class Wirelength:
+    """
+    Half-perimeter wirelength (HPWL) of the nets of a problem.
+
+    The length of every net and the centers of the rectangles are kept, so that after a move only the nets
+    connected to the moved rectangles are recomputed, and a rejected move can be rolled back.
+    """
+
+    def __init__(self, problem: Problem) -> None:
+        if not isinstance(problem, Problem):
+            raise TypeError("Invalid argument: 'problem' must be an instance of Problem.")
+
+        self.problem = problem
+        self.centers_x: List[float] = [0.0] * problem.n
+        self.centers_y: List[float] = [0.0] * problem.n
+        self.rotations: List[int] = [0] * problem.n
+        self.lengths: List[float] = [0.0] * len(problem.nets)
+        self.total = 0.0
+        self._undo: Optional[Tuple] = None
+
+    def load(self, centers: Sequence[Tuple], rotations: Sequence[int]) -> float:
+        """
+        Evaluate all the nets from the centers (x, y) and rotations of the rectangles.
+        """
+
+        self._undo = None
+        self.centers_x = [c[0] for c in centers]
+        self.centers_y = [c[1] for c in centers]
+        self.rotations = list(rotations)
+        self.lengths = [self._length(net) for net in self.problem.nets]
+        self.total = sum(self.lengths)
+
+        return self.total
+
+    def move(self, centers: Dict[int, Tuple], rotations: Sequence[int]) -> float:
+        """
+        Move the rectangles to the new centers {id: (x, y)} (and rotations), recompute the nets connected to them,
+        and return the new total. The previous pending move is committed.
+        """
+
+        self._undo = None
+        old_centers = {i: (self.centers_x[i], self.centers_y[i], self.rotations[i]) for i in centers}
+        for i, (x, y) in centers.items():
+            self.centers_x[i] = x
+            self.centers_y[i] = y
+            self.rotations[i] = rotations[i]
+
+        nets = self._nets_of(centers)
+        old_lengths = {k: self.lengths[k] for k in nets}
+        old_total = self.total
+        for k in nets:
+            length = self._length(self.problem.nets[k])
+            self.total += length - self.lengths[k]
+            self.lengths[k] = length
+
+        self._undo = (old_centers, old_lengths, old_total)
+
+        return self.total
+
+    def commit(self) -> None:
+        """
+        Accept the pending move.
+        """
+
+        self._undo = None
+
+    def rollback(self) -> None:
+        """
+        Reject the pending move and restore the lengths.
+        """
+
+        if self._undo is None:
+            return
+
+        old_centers, old_lengths, old_total = self._undo
+        self._undo = None
+
+        for i, (x, y, rotation) in old_centers.items():
+            self.centers_x[i] = x
+            self.centers_y[i] = y
+            self.rotations[i] = rotation
+        for k, length in old_lengths.items():
+            self.lengths[k] = length
+        self.total = old_total
+
+    @classmethod
+    def hpwl(cls, problem: Problem, positions: List[Dict], rotations: Optional[Sequence[int]] = None) -> float:
+        """
+        Total HPWL of a floorplan (the positions of Floorplan, with the rotations of the solution).
+        """
+
+        centers = [(0.0, 0.0)] * problem.n
+        for p in positions:
+            centers[p["id"]] = (p["x"] + p["width"] / 2, p["y"] + p["height"] / 2)
+        rotations = rotations if rotations is not None else [0] * problem.n
+
+        return cls(problem).load(centers, rotations)
+
+    def _nets_of(self, rectangles: Iterable[int]) -> Set[int]:
+        nets_of = self.problem.nets_of
+        return set(k for i in rectangles for k in nets_of[i])
+
+    def _length(self, net: List[Tuple]) -> float:
+        centers_x, centers_y, rotations = self.centers_x, self.centers_y, self.rotations
+
+        xs = []
+        ys = []
+        for i, dx, dy in net:
+            if rotations[i] % 2 == 1:
+                dx, dy = -dy, dx
+            xs.append(centers_x[i] + dx)
+            ys.append(centers_y[i] + dy)
+
+        if not xs:
+            return 0.0
+
+        return (max(xs) - min(xs)) + (max(ys) - min(ys))
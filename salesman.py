@@ -29,7 +29,7 @@ class TravellingSalesmanProblem(Annealer):
         """Swaps two cities in the route."""
         # no efficiency gain, just proof of concept
         # demonstrates returning the delta energy (optional)
-        initial_energy = self.energy()
+        initial_energy = self.current_energy
 
         a = random.randint(0, len(self.state) - 1)
         b = random.randint(0, len(self.state) - 1)
@@ -58,7 +58,7 @@ class ICPlacementAnnealer(Annealer):
         """Swaps two cities in the route."""
         # no efficiency gain, just proof of concept
         # demonstrates returning the delta energy (optional)
-        initial_energy = self.energy()
+        initial_energy = self.current_energy
 
         a = random.randint(0, len(self.state) - 1)
         b = random.randint(0, len(self.state) - 1)
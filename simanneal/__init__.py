@@ -1,5 +1,6 @@
 from __future__ import absolute_import
-from .anneal import Annealer
+from .anneal import Annealer, estimate_temperatures
+from .tempering import ParallelTempering
 
-__all__ = ['Annealer']
+__all__ = ['Annealer', 'ParallelTempering', 'estimate_temperatures']
 __version__ = "0.5.0"
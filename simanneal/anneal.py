@@ -26,6 +26,36 @@ def time_string(seconds):
     return '%4i:%02i:%02i' % (h, m, s)
 
 
+def estimate_temperatures(deltas, acceptance=0.98, final_acceptance=0.01):
+    """Returns (Tmax, Tmin) estimated from a sample of move energy deltas.
+
+    Tmax is the temperature whose expected acceptance over the sampled
+    moves is `acceptance`, and Tmin is the temperature at which the
+    smallest uphill move is accepted with probability `final_acceptance`.
+    """
+    deltas = [float(d) for d in deltas]
+    uphill = sorted(d for d in deltas if d > 0.0)
+    if not uphill:
+        # No uphill move was sampled, any temperature accepts everything
+        return 1.0, 1.0
+
+    def expected_acceptance(T):
+        return (len(deltas) - len(uphill) + sum(math.exp(-d / T) for d in uphill)) / len(deltas)
+
+    # The acceptance is monotonic in T, bisect on log(T)
+    lower, upper = math.log(uphill[0]) - 10.0, math.log(uphill[-1]) + 10.0
+    for _ in range(60):
+        middle = (lower + upper) / 2.0
+        if expected_acceptance(math.exp(middle)) < acceptance:
+            lower = middle
+        else:
+            upper = middle
+    Tmax = math.exp(upper)
+    Tmin = min(-uphill[0] / math.log(final_acceptance), Tmax)
+
+    return Tmax, Tmin
+
+
 class Annealer(object):
 
     """Performs simulated annealing by calling functions to calculate
@@ -40,14 +70,22 @@ class Annealer(object):
     Tmin = 2.5
     steps = 50000
     updates = 100
+    time_limit = None
+    stagnation_steps = None
+    lower_bound = None
+    target_gap = 0.0
     copy_strategy = 'deepcopy'
+    undo_moves = False
     user_exit = False
+    cancel_token = None
     save_state_on_exit = False
 
     # placeholders
     best_state = None
     best_energy = None
     start = None
+    stop_reason = None
+    _current_energy = None
 
     def __init__(self, initial_state=None, load_state=None):
         if initial_state is not None:
@@ -83,11 +121,53 @@ class Annealer(object):
         """Calculate state's energy"""
         pass
 
+    def undo(self):
+        """Revert the last move
+
+        Used instead of copying the state on every step when
+        self.undo_moves is True: move() records what it changed
+        and undo() restores it when the move is rejected.
+        """
+        raise NotImplementedError('undo() is required when undo_moves is True')
+
+    @property
+    def current_energy(self):
+        """Energy of the current state
+
+        anneal() and auto() provide it while calling move(), so that move()
+        can return the energy difference without evaluating the unchanged
+        state again. Outside of them it is calculated by energy().
+        """
+        if self._current_energy is None:
+            return self.energy()
+        return self._current_energy
+
+    def gap(self, E):
+        """Relative gap of the energy E to self.lower_bound
+
+        Infinite if no lower bound is given.
+        """
+        if self.lower_bound is None:
+            return float('inf')
+        if self.lower_bound > 0:
+            return (E - self.lower_bound) / self.lower_bound
+        return 0.0 if E <= self.lower_bound else float('inf')
+
     def set_user_exit(self, signum, frame):
         """Raises the user_exit flag, further iterations are stopped
         """
         self.user_exit = True
 
+    def cancelled(self):
+        """Whether self.cancel_token is set
+
+        The token is any object with an is_set() method, e.g. a
+        threading.Event, or a multiprocessing.Event to be set from
+        another process. Unlike the SIGINT handler of set_user_exit,
+        it can be set from any thread.
+        """
+        return self.cancel_token is not None and self.cancel_token.is_set()
+
     def set_schedule(self, schedule):
         """Takes the output from `auto` and sets the attributes
         """
@@ -156,7 +236,10 @@ class Annealer(object):
                   file=sys.stderr, end="")
             sys.stderr.flush()
         else:
-            remain = (self.steps - step) * (elapsed / step)
+            if self.time_limit is None:
+                remain = (self.steps - step) * (elapsed / step)
+            else:
+                remain = max(self.time_limit - elapsed, 0.0)
             print('\r{Temp:12.5f}  {Energy:12.2f}   {Accept:7.2%}   {Improve:7.2%}  {Elapsed:s}  {Remaining:s}'
                   .format(Temp=T,
                           Energy=E,
@@ -173,9 +256,39 @@ class Annealer(object):
         Parameters
         state : an initial arrangement of the system
 
+        See `anneal_iter` for the stopping rules.
+
         Returns
         (state, energy): the best state and energy found.
         """
+        for _ in self.anneal_iter():
+            pass
+
+        # Return best state and energy
+        return self.best_state, self.best_energy
+
+    def anneal_iter(self):
+        """Minimizes the energy of a system by simulated annealing,
+        as a generator reporting the progress.
+
+        If self.time_limit (seconds) is set, the temperature follows the
+        elapsed time instead of the step index, the anneal stops at the
+        time limit, and self.steps is set to the number of steps made.
+
+        The anneal stops early when the best energy has not improved for
+        self.stagnation_steps steps, when the relative gap of the best
+        energy to self.lower_bound is at most self.target_gap, or when
+        self.cancel_token is set. The reason of the stop is set to
+        self.stop_reason ('steps', 'time_limit', 'stagnation', 'gap',
+        'cancelled', or 'user_exit').
+
+        Yields
+        (step, energy): the step and the best energy, at the start and
+        each time the best energy improves; the best state is in
+        self.best_state. The generator is suspended until the next item
+        is requested, and the anneal stops (with the best state set to
+        self.state) when the generator is exhausted or closed.
+        """
         step = 0
         self.start = time.time()
 
@@ -188,49 +301,96 @@ class Annealer(object):
         # Note initial state
         T = self.Tmax
         E = self.energy()
-        prevState = self.copy_state(self.state)
+        prevState = None if self.undo_moves else self.copy_state(self.state)
         prevEnergy = E
         self.best_state = self.copy_state(self.state)
         self.best_energy = E
-        trials = accepts = improves = 0
-        if self.updates > 0:
-            updateWavelength = self.steps / self.updates
-            self.update(step, T, E, None, None)
-
-        # Attempt moves to new states
-        while step < self.steps and not self.user_exit:
-            step += 1
-            T = self.Tmax * math.exp(Tfactor * step / self.steps)
-            dE = self.move()
-            if dE is None:
-                E = self.energy()
-                dE = E - prevEnergy
-            else:
-                E += dE
-            trials += 1
-            if dE > 0.0 and math.exp(-dE / T) < random.random():
-                # Restore previous state
-                self.state = self.copy_state(prevState)
-                E = prevEnergy
-            else:
-                # Accept new state and compare to best state
-                accepts += 1
-                if dE < 0.0:
-                    improves += 1
-                prevState = self.copy_state(self.state)
-                prevEnergy = E
-                if E < self.best_energy:
-                    self.best_state = self.copy_state(self.state)
-                    self.best_energy = E
-            if self.updates > 1:
-                if (step // updateWavelength) > ((step - 1) // updateWavelength):
-                    self.update(
-                        step, T, E, accepts / trials, improves / trials)
-                    trials = accepts = improves = 0
-
-        self.state = self.copy_state(self.best_state)
-        if self.save_state_on_exit:
-            self.save_state()
+        self.stop_reason = 'gap' if self.gap(E) <= self.target_gap else None
+        bestStep = 0
+        try:
+            yield step, E
+            trials = accepts = improves = 0
+            updateCount = 0
+            if self.updates > 0:
+                updateWavelength = self.steps / self.updates
+                self.update(step, T, E, None, None)
+
+            # Attempt moves to new states
+            while self.stop_reason is None:
+                if self.user_exit:
+                    self.stop_reason = 'user_exit'
+                    break
+                if self.cancelled():
+                    self.stop_reason = 'cancelled'
+                    break
+                if self.stagnation_steps is not None and step - bestStep >= self.stagnation_steps:
+                    self.stop_reason = 'stagnation'
+                    break
+                if self.time_limit is None:
+                    if step >= self.steps:
+                        self.stop_reason = 'steps'
+                        break
+                    fraction = (step + 1) / self.steps
+                else:
+                    elapsed = time.time() - self.start
+                    if elapsed >= self.time_limit:
+                        self.stop_reason = 'time_limit'
+                        break
+                    fraction = elapsed / self.time_limit
+                step += 1
+                T = self.Tmax * math.exp(Tfactor * fraction)
+                self._current_energy = E
+                dE = self.move()
+                self._current_energy = None
+                if dE is None:
+                    E = self.energy()
+                    dE = E - prevEnergy
+                else:
+                    E += dE
+                trials += 1
+                if dE > 0.0 and math.exp(-dE / T) < random.random():
+                    # Restore previous state
+                    if self.undo_moves:
+                        self.undo()
+                    else:
+                        self.state = self.copy_state(prevState)
+                    E = prevEnergy
+                else:
+                    # Accept new state and compare to best state
+                    accepts += 1
+                    if dE < 0.0:
+                        improves += 1
+                    if not self.undo_moves:
+                        prevState = self.copy_state(self.state)
+                    prevEnergy = E
+                    if E < self.best_energy:
+                        self.best_state = self.copy_state(self.state)
+                        self.best_energy = E
+                        bestStep = step
+                        if self.gap(E) <= self.target_gap:
+                            self.stop_reason = 'gap'
+                        yield step, E
+                if self.updates > 1:
+                    if self.time_limit is None:
+                        due = (step // updateWavelength) > ((step - 1) // updateWavelength)
+                    else:
+                        due = int(fraction * self.updates) > updateCount
+                        updateCount = int(fraction * self.updates)
+                    if due:
+                        self.update(
+                            step, T, E, accepts / trials, improves / trials)
+                        trials = accepts = improves = 0
+        except GeneratorExit:
+            # Closed by the caller
+            self.stop_reason = 'user_exit'
+            raise
+        finally:
+            if self.time_limit is not None:
+                self.steps = step
+
+            self.state = self.copy_state(self.best_state)
+            if self.save_state_on_exit:
+                self.save_state()
 
         # Return best state and energy
         return self.best_state, self.best_energy
@@ -246,24 +406,32 @@ class Annealer(object):
             """Anneals a system at constant temperature and returns the state,
             energy, rate of acceptance, and rate of improvement."""
             E = self.energy()
-            prevState = self.copy_state(self.state)
+            prevState = None if self.undo_moves else self.copy_state(self.state)
             prevEnergy = E
             accepts, improves = 0, 0
             for _ in range(steps):
+                if self.cancelled():
+                    break
+                self._current_energy = E
                 dE = self.move()
+                self._current_energy = None
                 if dE is None:
                     E = self.energy()
                     dE = E - prevEnergy
                 else:
                     E = prevEnergy + dE
                 if dE > 0.0 and math.exp(-dE / T) < random.random():
-                    self.state = self.copy_state(prevState)
+                    if self.undo_moves:
+                        self.undo()
+                    else:
+                        self.state = self.copy_state(prevState)
                     E = prevEnergy
                 else:
                     accepts += 1
                     if dE < 0.0:
                         improves += 1
-                    prevState = self.copy_state(self.state)
+                    if not self.undo_moves:
+                        prevState = self.copy_state(self.state)
                     prevEnergy = E
             return E, float(accepts) / steps, float(improves) / steps
 
@@ -275,9 +443,11 @@ class Annealer(object):
         T = 0.0
         E = self.energy()
         self.update(step, T, E, None, None)
+        self._current_energy = E
         while T == 0.0:
             step += 1
             dE = self.move()
+            self._current_energy = None
             if dE is None:
                 dE = self.energy() - E
             T = abs(dE)
@@ -285,13 +455,14 @@ class Annealer(object):
         # Search for Tmax - a temperature that gives 98% acceptance
         E, acceptance, improvement = run(T, steps)
 
+        # A cancelled search stops at the current temperature
         step += steps
-        while acceptance > 0.98:
+        while acceptance > 0.98 and not self.cancelled():
             T = round_figures(T / 1.5, 2)
             E, acceptance, improvement = run(T, steps)
             step += steps
             self.update(step, T, E, acceptance, improvement)
-        while acceptance < 0.98:
+        while acceptance < 0.98 and not self.cancelled():
             T = round_figures(T * 1.5, 2)
             E, acceptance, improvement = run(T, steps)
             step += steps
@@ -299,7 +470,7 @@ class Annealer(object):
         Tmax = T
 
         # Search for Tmin - a temperature that gives 0% improvement
-        while improvement > 0.0:
+        while improvement > 0.0 and not self.cancelled():
             T = round_figures(T / 1.5, 2)
             E, acceptance, improvement = run(T, steps)
             step += steps
@@ -312,3 +483,62 @@ class Annealer(object):
 
         # Don't perform anneal, just return params
         return {'tmax': Tmax, 'tmin': Tmin, 'steps': duration, 'updates': self.updates}
+
+    def estimate_schedule(self, minutes, samples=100, acceptance=0.98, final_acceptance=0.01,
+                          deadline=None, max_fraction=0.1):
+        """Estimates the temperature settings from one sample of move
+        energy deltas, instead of the trial runs of `auto`.
+
+        A random walk of up to `samples` moves collects the energy deltas
+        and the time per move. Tmax is the temperature whose expected
+        acceptance over the sampled moves is `acceptance`, Tmin is the
+        temperature at which the smallest uphill move is accepted with
+        probability `final_acceptance`, and the number of steps fills the
+        rest of the time budget of `minutes` (including the calibration).
+        The initial state is restored afterwards.
+
+        The random walk stops early at the `deadline` (time.time()), or
+        when it has taken `max_fraction` of the time budget, or when
+        self.cancel_token is set, and the schedule is estimated from the
+        moves sampled so far.
+
+        Returns a dictionary suitable for the `set_schedule` method, with
+        the calibration time and its fraction of the time budget.
+        """
+        self.start = time.time()
+        initial_state = self.copy_state(self.state)
+        budget = 60.0 * minutes
+        stop = self.start + max_fraction * budget
+        if deadline is not None:
+            stop = min(stop, deadline)
+
+        # Random walk: every move is accepted
+        E = self.energy()
+        deltas = []
+        for _ in range(samples):
+            if self.cancelled():
+                break
+            # At least one move is sampled to measure the time per move
+            if deltas and time.time() >= stop:
+                break
+            self._current_energy = E
+            dE = self.move()
+            self._current_energy = None
+            if dE is None:
+                dE = self.energy() - E
+            E += dE
+            deltas.append(dE)
+        elapsed = time.time() - self.start
+        time_per_step = elapsed / max(len(deltas), 1)
+
+        self.state = self.copy_state(initial_state)
+
+        Tmax, Tmin = estimate_temperatures(deltas, acceptance, final_acceptance)
+
+        # Calculate anneal duration from the rest of the time budget
+        calibration = time.time() - self.start
+        steps = int(max(budget - calibration, 0.0) / time_per_step) if time_per_step > 0.0 else 0
+
+        return {'tmax': Tmax, 'tmin': Tmin, 'steps': steps, 'updates': self.updates,
+                'calibration_seconds': calibration, 'calibration_samples': len(deltas),
+                'calibration_fraction': calibration / budget if budget > 0.0 else 1.0}
@@ -0,0 +1,229 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import copy
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# The annealer of the current worker process, set by _init_worker
+_worker_annealer = None
+
+
+def _init_worker(annealer):
+    """Keeps a copy of the annealer in the worker process."""
+    global _worker_annealer
+    _worker_annealer = annealer
+
+
+def _run_replica(state, T, steps, seed, deadline=None):
+    """Runs a replica at a constant temperature in the worker process,
+    stopping early at the deadline (time.time()) if one is given, or
+    when the annealer's cancel_token is set.
+
+    Returns the state and energy at the end, the best state and energy,
+    the number of accepted moves, and the number of steps made."""
+    annealer = _worker_annealer
+    random.seed(seed)
+    annealer.state = annealer.copy_state(state)
+
+    E = annealer.energy()
+    prevState = None if annealer.undo_moves else annealer.copy_state(annealer.state)
+    prevEnergy = E
+    best_state = annealer.copy_state(annealer.state)
+    best_energy = E
+    accepts = 0
+    done = 0
+    for _ in range(steps):
+        if deadline is not None and time.time() >= deadline:
+            break
+        if annealer.cancelled():
+            break
+        done += 1
+        annealer._current_energy = E
+        dE = annealer.move()
+        annealer._current_energy = None
+        if dE is None:
+            E = annealer.energy()
+            dE = E - prevEnergy
+        else:
+            E = prevEnergy + dE
+        if dE > 0.0 and math.exp(-dE / T) < random.random():
+            if annealer.undo_moves:
+                annealer.undo()
+            else:
+                annealer.state = annealer.copy_state(prevState)
+            E = prevEnergy
+        else:
+            accepts += 1
+            if not annealer.undo_moves:
+                prevState = annealer.copy_state(annealer.state)
+            prevEnergy = E
+            if E < best_energy:
+                best_state = annealer.copy_state(annealer.state)
+                best_energy = E
+
+    return annealer.state, E, best_state, best_energy, accepts, done
+
+
+class ParallelTempering(object):
+
+    """Replica-exchange (parallel tempering) engine for an Annealer.
+
+    Replicas of the annealer run at a geometric ladder of temperatures
+    between Tmin and Tmax in worker processes. Every exchange_interval
+    steps, replicas at neighbouring temperatures swap their states with
+    the Metropolis probability min(1, exp((1/Ti - 1/Tj) * (Ei - Ej))),
+    so good states found at high temperatures move down the ladder
+    instead of the chain stalling in a bad basin.
+
+    With a time_limit (seconds), the exchange rounds continue until the
+    time limit instead of for a number of steps. The replicas stop when
+    the annealer's cancel_token is set; to be seen by the worker
+    processes, it must be a multiprocessing.Event.
+
+    The early stops of the annealer apply between the exchange rounds:
+    no improvement of the best energy for the annealer's stagnation_steps
+    steps (of each replica), or a relative gap of the best energy to its
+    lower_bound of at most its target_gap. The reason of the stop is set
+    to self.stop_reason, as Annealer.anneal does.
+    """
+
+    def __init__(self, annealer, replicas=8, Tmax=None, Tmin=None,
+                 steps=None, exchange_interval=100, workers=None, seed=None,
+                 time_limit=None):
+        if replicas < 2:
+            raise ValueError('Parallel tempering requires at least two replicas.')
+
+        self.annealer = annealer
+        self.replicas = replicas
+        self.Tmax = annealer.Tmax if Tmax is None else Tmax
+        self.Tmin = annealer.Tmin if Tmin is None else Tmin
+        self.steps = annealer.steps if steps is None else steps
+        self.exchange_interval = exchange_interval
+        self.workers = replicas if workers is None else workers
+        self.seed = seed
+        self.time_limit = time_limit
+
+        if self.Tmin <= 0.0 or self.Tmax < self.Tmin:
+            raise ValueError('Temperatures must satisfy 0 < Tmin <= Tmax.')
+
+        # Geometric ladder from the coldest to the hottest replica
+        ratio = (self.Tmax / self.Tmin) ** (1.0 / (replicas - 1))
+        self.temperatures = [self.Tmin * ratio ** k for k in range(replicas)]
+
+        # placeholders
+        self.best_state = None
+        self.best_energy = None
+        self.exchanges = None
+        self.exchange_attempts = None
+        self.acceptance = None
+        self.elapsed = None
+        self.stop_reason = None
+
+    def run(self):
+        """Runs the replicas and returns the best state and energy found.
+
+        The best state is also set to the annealer's state."""
+        annealer = self.annealer
+        rng = random.Random(self.seed)
+        rounds = max(1, int(math.ceil(self.steps / self.exchange_interval)))
+        start = time.time()
+        deadline = None if self.time_limit is None else start + self.time_limit
+
+        states = [annealer.copy_state(annealer.state) for _ in range(self.replicas)]
+        energies = [annealer.energy()] * self.replicas
+        self.best_state = annealer.copy_state(annealer.state)
+        self.best_energy = energies[0]
+        self.exchanges = [0] * (self.replicas - 1)
+        self.exchange_attempts = [0] * (self.replicas - 1)
+        accepts = [0] * self.replicas
+        done = [0] * self.replicas
+
+        if self.workers > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker, initargs=(annealer,))
+        else:
+            executor = None
+            random_state = random.getstate()
+            # The token is shared, not copied (an Event cannot be deep-copied)
+            cancel_token, annealer.cancel_token = annealer.cancel_token, None
+            try:
+                replica = copy.deepcopy(annealer)
+            finally:
+                annealer.cancel_token = cancel_token
+            replica.cancel_token = cancel_token
+            _init_worker(replica)
+
+        self.stop_reason = 'gap' if annealer.gap(self.best_energy) <= annealer.target_gap else None
+        stagnant = 0  # steps (of each replica) since the best energy improved
+        try:
+            r = 0
+            while self.stop_reason is None:
+                if annealer.user_exit:
+                    self.stop_reason = 'user_exit'
+                    break
+                if annealer.cancelled():
+                    self.stop_reason = 'cancelled'
+                    break
+                if annealer.stagnation_steps is not None and stagnant >= annealer.stagnation_steps:
+                    self.stop_reason = 'stagnation'
+                    break
+                if deadline is None:
+                    if r >= rounds:
+                        self.stop_reason = 'steps'
+                        break
+                    steps = min(self.exchange_interval, self.steps - r * self.exchange_interval)
+                else:
+                    if time.time() >= deadline:
+                        self.stop_reason = 'time_limit'
+                        break
+                    steps = self.exchange_interval
+
+                args = [(states[k], self.temperatures[k], steps, rng.randrange(2 ** 32), deadline)
+                        for k in range(self.replicas)]
+                if executor is not None:
+                    results = list(executor.map(_run_replica, *zip(*args)))
+                else:
+                    results = [_run_replica(*a) for a in args]
+
+                improved = False
+                for k, (state, E, best_state, best_energy, accepted, steps_done) in enumerate(results):
+                    states[k] = state
+                    energies[k] = E
+                    accepts[k] += accepted
+                    done[k] += steps_done
+                    if best_energy < self.best_energy:
+                        self.best_state = best_state
+                        self.best_energy = best_energy
+                        improved = True
+                stagnant = 0 if improved else stagnant + steps
+                if annealer.gap(self.best_energy) <= annealer.target_gap:
+                    self.stop_reason = 'gap'
+
+                # Exchange between neighbours, alternating even and odd pairs
+                for k in range(r % 2, self.replicas - 1, 2):
+                    self.exchange_attempts[k] += 1
+                    delta = (1.0 / self.temperatures[k] - 1.0 / self.temperatures[k + 1]) * (energies[k] - energies[k + 1])
+                    if delta >= 0.0 or rng.random() < math.exp(delta):
+                        states[k], states[k + 1] = states[k + 1], states[k]
+                        energies[k], energies[k + 1] = energies[k + 1], energies[k]
+                        self.exchanges[k] += 1
+                r += 1
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            else:
+                random.setstate(random_state)
+                _init_worker(None)
+
+        self.acceptance = [a / float(d) if d else 0.0 for a, d in zip(accepts, done)]
+        self.elapsed = time.time() - start
+
+        annealer.state = annealer.copy_state(self.best_state)
+        annealer.best_state = self.best_state
+        annealer.best_energy = self.best_energy
+
+        return self.best_state, self.best_energy
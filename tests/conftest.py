@@ -0,0 +1,58 @@
+import random
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pytest
+
+import rectangle_packing_solver as rps
+
+
+def _random_problem(
+    rnd: random.Random,
+    n: int,
+    nfixed: int = 0,
+    nets: bool = False,
+    float_edges: bool = False,
+    fixed_blocks: Optional[List[Dict]] = None,
+) -> rps.Problem:
+    """
+    A problem of n random rectangles (about half rotatable), nfixed random fixed blocks (at half-integer
+    edges if float_edges is True) after the given fixed_blocks, and n / 2 random nets if nets is True.
+    """
+
+    rectangles = [(rnd.randint(1, 20), rnd.randint(1, 20), rnd.random() < 0.5) for _ in range(n)]
+    fixed_blocks = list(fixed_blocks) if fixed_blocks is not None else []
+    for _ in range(nfixed):
+        left = rnd.randint(0, 60)
+        bottom = rnd.randint(0, 60)
+        fixed_blocks.append(
+            {"left": left, "right": left + rnd.randint(1, 15), "bottom": bottom, "top": bottom + rnd.randint(1, 15)}
+        )
+        if float_edges:
+            fixed_blocks[-1] = {key: edge + 0.5 for key, edge in fixed_blocks[-1].items()}
+    net_list = [rnd.sample(range(n), min(n, rnd.randint(2, 4))) for _ in range(n // 2)] if nets else None
+
+    return rps.Problem(rectangles=rectangles, fixed_blocks=fixed_blocks, nets=net_list)
+
+
+def _random_state(rnd: random.Random, problem: rps.Problem) -> Tuple[List[int], List[int], List[int]]:
+    """
+    A random sequence pair (G_{+}, G_{-}) and random rotations of the rotatable rectangles.
+    """
+
+    gp = list(range(problem.n))
+    gn = list(range(problem.n))
+    rnd.shuffle(gp)
+    rnd.shuffle(gn)
+    rotations = [rnd.randint(0, 3) if problem.rotatable[i] else 0 for i in range(problem.n)]
+
+    return (gp, gn, rotations)
+
+
+@pytest.fixture
+def random_problem() -> Callable[..., rps.Problem]:
+    return _random_problem
+
+
+@pytest.fixture
+def random_state() -> Callable[..., Tuple[List[int], List[int], List[int]]]:
+    return _random_state
@@ -0,0 +1,54 @@
+import random
+import threading
+import time
+
+import rectangle_packing_solver as rps
+
+
+def _problem(n: int) -> rps.Problem:
+    rnd = random.Random(1)
+    return rps.Problem(rectangles=[(rnd.randint(1, 20), rnd.randint(1, 20), rnd.random() < 0.5) for _ in range(n)])
+
+
+def _solve_cancelled(problem: rps.Problem, delay: float, **kwargs) -> float:
+    token = threading.Event()
+    timer = threading.Timer(delay, token.set)
+    timer.start()
+    try:
+        start = time.time()
+        solution = rps.Solver().solve(problem, cancel_token=token, **kwargs)
+        elapsed = time.time() - start
+    finally:
+        timer.cancel()
+
+    assert solution.statistics["cancelled"] is True
+    assert len(solution.floorplan.positions) == problem.n
+
+    return elapsed
+
+
+def test_cancel_during_fast_calibration() -> None:
+    problem = _problem(300)
+    elapsed = _solve_cancelled(problem, 0.2, schedule="fast", simanneal_minutes=10.0, simanneal_steps=100000)
+    assert elapsed < 1.0
+
+
+def test_cancel_during_warm_start_calibration() -> None:
+    problem = _problem(300)
+    previous = rps.Solver().solve(problem, schedule={"tmax": 10.0, "tmin": 1.0, "steps": 10, "updates": 0})
+    elapsed = _solve_cancelled(problem, 0.2, previous=previous, simanneal_minutes=10.0, simanneal_steps=100000)
+    assert elapsed < 1.0
+
+
+def test_cancel_during_auto_calibration() -> None:
+    problem = _problem(100)
+    elapsed = _solve_cancelled(problem, 0.2, schedule="auto", simanneal_minutes=10.0, simanneal_steps=2000)
+    assert elapsed < 1.0
+
+
+def test_cancel_before_solve() -> None:
+    problem = _problem(50)
+    token = threading.Event()
+    token.set()
+    solution = rps.Solver().solve(problem, cancel_token=token, simanneal_minutes=10.0)
+    assert solution.statistics["cancelled"] is True
@@ -0,0 +1,59 @@
+import random
+from typing import Dict, List
+
+import pytest
+
+import rectangle_packing_solver as rps
+
+
+def _rotations(problem: rps.Problem, positions: List[Dict]) -> List[int]:
+    rotations = [0] * problem.n
+    for p in positions:
+        if p["width"] != problem.widths[p["id"]]:
+            rotations[p["id"]] = 1
+
+    return rotations
+
+
+@pytest.mark.parametrize("method", ["shelf", "skyline"])
+@pytest.mark.parametrize("seed", range(10))
+def test_encode_round_trip(seed: int, method: str, random_problem) -> None:
+    rnd = random.Random(seed)
+    for _ in range(10):
+        problem = random_problem(rnd, rnd.randint(1, 30))
+        seeded = getattr(rps.Seeder, method)(problem)
+        rotations = _rotations(problem, seeded.positions)
+
+        seqpair = rps.SequencePair.encode(seeded)
+        floorplan = seqpair.decode(problem=problem, rotations=rotations, engine="lcs")
+
+        # Every rectangle is decoded at its seeded position or at the left/bottom of it, with the same size
+        decoded = {p["id"]: p for p in floorplan.positions}
+        for p in seeded.positions:
+            q = decoded[p["id"]]
+            assert (q["width"], q["height"]) == (p["width"], p["height"])
+            assert q["x"] <= p["x"]
+            assert q["y"] <= p["y"]
+
+
+def test_encode_positions() -> None:
+    positions = [
+        {"id": 0, "x": 0, "y": 0, "width": 2, "height": 3},
+        {"id": 1, "x": 2, "y": 0, "width": 2, "height": 2},
+        {"id": 2, "x": 2, "y": 2, "width": 1, "height": 1},
+    ]
+    problem = rps.Problem(rectangles=[(2, 3), (2, 2), (1, 1)])
+
+    floorplan = rps.SequencePair.encode(positions).decode(problem=problem)
+
+    assert [(p["x"], p["y"]) for p in floorplan.positions] == [(0, 0), (2, 0), (2, 2)]
+
+
+def test_encode_overlapping_placement() -> None:
+    positions = [
+        {"id": 0, "x": 0, "y": 0, "width": 2, "height": 2},
+        {"id": 1, "x": 1, "y": 1, "width": 2, "height": 2},
+    ]
+
+    with pytest.raises(ValueError):
+        rps.SequencePair.encode(positions)
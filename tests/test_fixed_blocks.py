@@ -0,0 +1,49 @@
+import random
+from typing import Dict, List
+
+import pytest
+
+import rectangle_packing_solver as rps
+
+
+def _overlap(a: Dict, b: Dict) -> bool:
+    return (a["left"] < b["right"]) and (b["left"] < a["right"]) and (a["bottom"] < b["top"]) and (b["bottom"] < a["top"])
+
+
+def _assert_overlap_free(problem: rps.Problem, positions: List[Dict]) -> None:
+    rectangles = [
+        {"left": p["x"], "right": p["x"] + p["width"], "bottom": p["y"], "top": p["y"] + p["height"]} for p in positions
+    ]
+    for i, a in enumerate(rectangles):
+        for fixed in problem.fixed_blocks:
+            assert not _overlap(a, fixed)
+        for b in rectangles[i + 1 :]:
+            assert not _overlap(a, b)
+
+
+@pytest.mark.parametrize("engine", ["graph", "lcs"])
+@pytest.mark.parametrize("seed", range(10))
+def test_decode_avoids_fixed_blocks(seed: int, engine: str, random_problem, random_state) -> None:
+    rnd = random.Random(seed)
+    for _ in range(20):
+        problem = random_problem(rnd, rnd.randint(1, 30), rnd.randint(1, 6), float_edges=rnd.random() < 0.5)
+        gp, gn, rotations = random_state(rnd, problem)
+        floorplan = rps.SequencePair(pair=(gp, gn)).decode(problem=problem, rotations=rotations, engine=engine)
+
+        _assert_overlap_free(problem, floorplan.positions)
+
+
+@pytest.mark.parametrize("engine", ["graph", "lcs"])
+@pytest.mark.parametrize("seed", range(10))
+def test_decode_avoids_stacked_fixed_blocks(seed: int, engine: str, random_problem, random_state) -> None:
+    rnd = random.Random(seed)
+    for _ in range(20):
+        # Keep-outs in a row with gaps narrower than the rectangles, so a block pushed past one of them
+        # lands on the next one, and a keep-out stacked on them with a different horizontal range
+        fixed_blocks = [{"left": 5 + 6 * k, "right": 10 + 6 * k, "bottom": 0, "top": 12} for k in range(4)]
+        fixed_blocks.append({"left": 8, "right": 20, "bottom": 12, "top": 20})
+        problem = random_problem(rnd, rnd.randint(1, 30), rnd.randint(0, 2), fixed_blocks=fixed_blocks)
+        gp, gn, rotations = random_state(rnd, problem)
+        floorplan = rps.SequencePair(pair=(gp, gn)).decode(problem=problem, rotations=rotations, engine=engine)
+
+        _assert_overlap_free(problem, floorplan.positions)
@@ -0,0 +1,52 @@
+import random
+from typing import List
+
+import pytest
+
+import rectangle_packing_solver as rps
+from rectangle_packing_solver.incremental import IncrementalEvaluator
+from rectangle_packing_solver.wirelength import Wirelength
+
+
+def _check(problem: rps.Problem, evaluator: IncrementalEvaluator, state: List[int]) -> None:
+    n = problem.n
+    rotations = state[2 * n : 3 * n]
+    floorplan = rps.SequencePair(pair=(state[0:n], state[n : 2 * n])).decode(problem, rotations, engine="graph")
+
+    assert evaluator.matches(state)
+    assert evaluator.bounding_box == floorplan.bounding_box
+    assert evaluator.positions() == [(p["x"], p["y"]) for p in floorplan.positions]
+    assert evaluator.hpwl == pytest.approx(Wirelength.hpwl(problem, floorplan.positions, rotations))
+
+
+@pytest.mark.parametrize("nets", [False, True])
+@pytest.mark.parametrize("seed", range(10))
+def test_incremental_equals_full_decode(seed: int, nets: bool, random_problem, random_state) -> None:
+    rnd = random.Random(seed)
+    for _ in range(10):
+        problem = random_problem(rnd, rnd.randint(2, 30), rnd.randint(0, 4), nets=nets)
+        gp, gn, rotations = random_state(rnd, problem)
+        state = gp + gn + rotations
+        evaluator = IncrementalEvaluator(problem, state)
+        n = problem.n
+
+        for _ in range(30):
+            i, j = rnd.sample(range(n), 2)
+            sequence = rnd.randint(0, 1)
+            rotate = i if (problem.rotatable[i] and rnd.random() < 0.5) else None
+
+            new_state = state[:]
+            offset = sequence * n
+            new_state[offset + i], new_state[offset + j] = new_state[offset + j], new_state[offset + i]
+            if rotate is not None:
+                new_state[2 * n + rotate] += 1
+
+            evaluator.swap(i, j, sequence=sequence, rotate=rotate)
+            _check(problem, evaluator, new_state)
+
+            if rnd.random() < 0.5:
+                # A rejected move restores the last accepted state
+                evaluator.rollback()
+                _check(problem, evaluator, state)
+            else:
+                state = new_state
@@ -0,0 +1,44 @@
+import json
+from typing import List
+
+import rectangle_packing_solver as rps
+
+
+def _keys(path: str) -> List[str]:
+    # The cache file is a JSON list of [key, schedule], from the least to the most recently used
+    with open(path) as f:
+        return [key for key, _ in json.load(f)]
+
+
+def test_schedule_cache_evicts_least_recently_used(tmp_path) -> None:
+    path = str(tmp_path / "schedules.json")
+    cache = rps.ScheduleCache(path, max_entries=2)
+
+    cache.put("a", {"tmax": 1.0})
+    cache.put("b", {"tmax": 2.0})
+    assert cache.get("a") == {"tmax": 1.0}
+    assert _keys(path) == ["b", "a"]
+
+    # "b" is the least recently used one, though "a" was stored first
+    cache.put("c", {"tmax": 3.0})
+    assert _keys(path) == ["a", "c"]
+    assert cache.get("b") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_schedule_cache_keeps_the_order_on_disk(tmp_path) -> None:
+    path = str(tmp_path / "schedules.json")
+    cache = rps.ScheduleCache(path, max_entries=2)
+    cache.put("a", {"tmax": 1.0})
+    cache.put("b", {"tmax": 2.0})
+    cache.get("a")
+
+    # Another instance (e.g. another process) reloads the cache from the disk
+    reloaded = rps.ScheduleCache(path, max_entries=2)
+    assert len(reloaded) == 2
+    assert reloaded.get("b") == {"tmax": 2.0}
+    reloaded.put("c", {"tmax": 3.0})
+
+    assert _keys(path) == ["b", "c"]
+    assert cache.get("a") is None
+    assert cache.get("c") == {"tmax": 3.0}
@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+import rectangle_packing_solver as rps
+from rectangle_packing_solver import lcs
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_lcs_decode_equals_graph_decode(seed: int, random_problem, random_state) -> None:
+    rnd = random.Random(seed)
+    for _ in range(30):
+        problem = random_problem(rnd, rnd.randint(1, 30), rnd.randint(0, 4))
+        gp, gn, rotations = random_state(rnd, problem)
+        seqpair = rps.SequencePair(pair=(gp, gn))
+
+        graph = seqpair.decode(problem=problem, rotations=rotations, engine="graph")
+        fast = seqpair.decode(problem=problem, rotations=rotations, engine="lcs")
+
+        assert fast.positions == graph.positions
+        assert fast.bounding_box == graph.bounding_box
+        assert lcs.bounding_box(problem, gp + gn + rotations) == graph.bounding_box
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_lcs_bounding_box_with_limits(seed: int, random_problem, random_state) -> None:
+    rnd = random.Random(100 + seed)
+    for _ in range(30):
+        problem = random_problem(rnd, rnd.randint(1, 30), rnd.randint(0, 4))
+        gp, gn, rotations = random_state(rnd, problem)
+        width, height = rps.SequencePair(pair=(gp, gn)).decode(problem, rotations, engine="graph").bounding_box
+
+        width_limit = rnd.randint(1, 2 * width)
+        height_limit = rnd.randint(1, 2 * height)
+        bounding_box = lcs.bounding_box(
+            problem, gp + gn + rotations, width_limit=width_limit, height_limit=height_limit
+        )
+
+        if (width <= width_limit) and (height <= height_limit):
+            # A feasible state is decoded completely
+            assert bounding_box == (width, height)
+        else:
+            # An infeasible state is detected, possibly before the decode is completed
+            assert (bounding_box[0] > width_limit) or (bounding_box[1] > height_limit)
+
+
+def test_lcs_decode_without_rotations(random_problem, random_state) -> None:
+    rnd = random.Random(0)
+    problem = random_problem(rnd, 20, 2)
+    gp, gn, _ = random_state(rnd, problem)
+    seqpair = rps.SequencePair(pair=(gp, gn))
+
+    graph = seqpair.decode(problem=problem, engine="graph")
+    fast = seqpair.decode(problem=problem, engine="lcs")
+
+    assert fast.positions == graph.positions
+    assert fast.bounding_box == graph.bounding_box
@@ -0,0 +1,36 @@
+import random
+
+import pytest
+
+import rectangle_packing_solver as rps
+
+
+@pytest.mark.parametrize("float_edges", [False, True])
+@pytest.mark.parametrize("seed", range(10))
+def test_decode_batch_equals_lcs_decode(seed: int, float_edges: bool, random_problem, random_state) -> None:
+    rnd = random.Random(seed)
+    for _ in range(10):
+        problem = random_problem(rnd, rnd.randint(1, 30), rnd.randint(0, 4), float_edges=float_edges)
+        states = [random_state(rnd, problem) for _ in range(rnd.randint(1, 8))]
+
+        batch = rps.decode_batch(problem, states, return_positions=True)
+
+        for k, (gp, gn, rotations) in enumerate(states):
+            floorplan = rps.SequencePair(pair=(gp, gn)).decode(problem=problem, rotations=rotations, engine="lcs")
+
+            assert tuple(batch["bounding_boxes"][k].tolist()) == floorplan.bounding_box
+            assert batch["areas"][k] == floorplan.bounding_box[0] * floorplan.bounding_box[1]
+            assert batch["positions"][k].tolist() == [
+                [p["x"], p["y"], p["width"], p["height"]] for p in floorplan.positions
+            ]
+
+
+def test_decode_batch_of_flat_states(random_problem, random_state) -> None:
+    rnd = random.Random(0)
+    problem = random_problem(rnd, 20, 2, float_edges=True)
+    states = [random_state(rnd, problem) for _ in range(4)]
+
+    stacked = rps.decode_batch(problem, states)
+    flat = rps.decode_batch(problem, [gp + gn + rotations for gp, gn, rotations in states])
+
+    assert stacked["bounding_boxes"].tolist() == flat["bounding_boxes"].tolist()